@@ -0,0 +1,119 @@
+"""
+Stored timestamps.
+
+Timestamps (sale_date, created_at, expiry_date, order_date, ...) are stored as
+BSON dates holding naive server-local time, as the strings they replace did.
+Documents written before the switch hold "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"
+strings until `app.services.date_migration` backfills them. Until the database
+records it as finished, range queries built here match both representations
+and pipelines read day values through `day_expr`.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Union
+from fastapi import HTTPException
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Timestamp fields stored as BSON dates, per collection
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "medicines": ["expiry_date"],
+    "sales": ["sale_date"],
+    "bills": ["created_at"],
+    "customers": ["created_at", "last_purchase_date"],
+    "suppliers": ["created_at", "updated_at"],
+    "purchase_orders": [
+        "order_date", "expected_delivery_date", "created_at", "updated_at",
+        "approved_at", "received_at", "cancelled_at"
+    ],
+    "notifications": ["created_at", "read_at"],
+}
+
+# Cleared once app_settings records the date migration as finished
+_legacy = {"strings": True}
+
+
+def legacy_strings_remaining() -> bool:
+    return _legacy["strings"]
+
+
+def set_legacy_strings(remaining: bool):
+    _legacy["strings"] = remaining
+
+
+def parse_datetime(value: Union[str, date, datetime, None]) -> Optional[datetime]:
+    """
+    Convert a stored or submitted value (datetime, date, "YYYY-MM-DD",
+    "YYYY-MM-DD HH:MM:SS" or ISO 8601) to a naive datetime. Empty values give
+    None; malformed strings raise ValueError.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        return datetime.combine(value, time())
+    else:
+        parsed = datetime.fromisoformat(value)
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def day_start(value: Union[str, date, datetime]) -> datetime:
+    """Midnight at the start of the day containing `value`; bad input is a 400."""
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    return datetime.combine(parsed.date(), time())
+
+
+def coerce_dates(doc: dict, collection: str) -> dict:
+    """Parse the timestamp fields of a submitted document in place (400 on bad input)."""
+    for field in DATE_FIELDS[collection]:
+        if isinstance(doc.get(field), str):
+            try:
+                doc[field] = parse_datetime(doc[field])
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {field}. Use YYYY-MM-DD")
+    return doc
+
+
+def _legacy_bound(bound: datetime) -> str:
+    # Midnight bounds compare correctly against both "YYYY-MM-DD" and "YYYY-MM-DD HH:MM:SS"
+    return bound.strftime(DATE_FORMAT if bound.time() == time() else DATETIME_FORMAT)
+
+
+def date_query(field: str, bounds: dict) -> dict:
+    """Filter `field` with comparison `bounds` ({"$gte": datetime, ...})."""
+    if not bounds:
+        return {}
+    if not legacy_strings_remaining():
+        return {field: bounds}
+    legacy = {op: _legacy_bound(bound) for op, bound in bounds.items()}
+    return {"$or": [{field: bounds}, {field: legacy}]}
+
+
+def date_range_query(field: str, start_date=None, end_date=None) -> dict:
+    """Filter `field` to the days start_date..end_date inclusive (either bound optional)."""
+    bounds = {}
+    if start_date:
+        bounds["$gte"] = day_start(start_date)
+    if end_date:
+        bounds["$lt"] = day_start(end_date) + timedelta(days=1)
+    return date_query(field, bounds)
+
+
+def day_expr(field: str) -> dict:
+    """Aggregation expression for midnight of the day in `field` ("$sale_date"), date or string."""
+    return {"$cond": [
+        {"$eq": [{"$type": field}, "string"]},
+        {"$dateFromString": {"dateString": {"$substrBytes": [field, 0, 10]}, "format": "%Y-%m-%d"}},
+        {"$dateTrunc": {"date": field, "unit": "day"}}
+    ]}
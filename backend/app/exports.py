@@ -0,0 +1,70 @@
+"""
+Streaming exports.
+
+Rows are read from an async Mongo cursor and written to a StreamingResponse as
+NDJSON or CSV in small chunks, so memory stays constant however large the date
+range is. The first row is sent on its own as soon as it arrives, so clients
+see data straight away; later rows go out ROWS_PER_CHUNK at a time.
+"""
+
+import csv
+import io
+import json
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+ROWS_PER_CHUNK = 500
+CURSOR_BATCH_SIZE = 1000
+
+
+async def _ndjson_chunks(rows):
+    chunk = []
+    chunk_size = 1
+    async for row in rows:
+        chunk.append(json.dumps(row, default=str))
+        if len(chunk) >= chunk_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+            chunk_size = ROWS_PER_CHUNK
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+async def _csv_chunks(rows, columns: list):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    count = 0
+    chunk_size = 1
+    async for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+            chunk_size = ROWS_PER_CHUNK
+    if count:
+        yield buffer.getvalue()
+
+
+def export_response(rows, columns: list, export_format: str, filename: str) -> StreamingResponse:
+    """Stream `rows` (an async iterator of flat dicts) as NDJSON or CSV."""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}")
+
+    body = _csv_chunks(rows, columns) if export_format == "csv" else _ndjson_chunks(rows)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
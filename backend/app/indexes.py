@@ -0,0 +1,222 @@
+"""
+Declarative index registry.
+
+Every index the API relies on is listed in INDEXES and created idempotently by
+`ensure_indexes` during the FastAPI lifespan (creating an index that already
+exists is a no-op). Unique indexes back the places where the code already
+assumes uniqueness, so startup fails if one of them can't be built. To
+compare the registry with the live database and list missing, undeclared and
+unused indexes, run:
+
+    python -m app.indexes --report
+"""
+
+import argparse
+import asyncio
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.pagination import PAGINATED_SORTS
+
+INDEXES = {
+    "users": [
+        # Registration and login look users up by email
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "customers": [
+        # create_customer rejects a phone number that is already registered. Named (and
+        # partial) so it can be built next to the plain phone_1 index of older installs
+        IndexModel(
+            [("phone", ASCENDING)],
+            unique=True,
+            name="phone_unique",
+            partialFilterExpression={"phone": {"$type": "string"}}
+        ),
+        IndexModel([("email", ASCENDING)]),
+    ],
+    "medicines": [
+        IndexModel([("name", ASCENDING)]),
+        IndexModel([("category", ASCENDING)]),
+        IndexModel([("expiry_date", ASCENDING)]),
+    ],
+    "lots": [
+        # Stock is kept per (medicine, batch, expiry date)
+        IndexModel([("medicine_id", ASCENDING), ("batch_no", ASCENDING), ("expiry_date", ASCENDING)], unique=True),
+        # FEFO allocation seeks to a medicine's earliest-expiring open lot
+        IndexModel(
+            [("medicine_id", ASCENDING), ("expiry_date", ASCENDING), ("_id", ASCENDING)],
+            name="fefo_open_lots",
+            partialFilterExpression={"quantity": {"$gt": 0}}
+        ),
+        # Expiring-stock list across all medicines
+        IndexModel(
+            [("expiry_date", ASCENDING)],
+            name="open_lots_by_expiry",
+            partialFilterExpression={"quantity": {"$gt": 0}}
+        ),
+    ],
+    "sales": [
+        IndexModel([("medicine_id", ASCENDING), ("sale_date", ASCENDING)]),
+        # Date-range reports and exports
+        IndexModel([("sale_date", ASCENDING)]),
+    ],
+    "bills": [
+        # Named (and partial) so it can be built next to the plain bill_number_1 index of older installs
+        IndexModel(
+            [("bill_number", ASCENDING)],
+            unique=True,
+            name="bill_number_unique",
+            partialFilterExpression={"bill_number": {"$type": "string"}}
+        ),
+    ],
+    "notifications": [
+        # One generated alert per (type, medicine, dedupe window), even across concurrent runs
+        IndexModel(
+            [("dedupe_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$exists": True}}
+        ),
+        # Backs the unread summary counts
+        IndexModel([("read", ASCENDING), ("priority", ASCENDING), ("type", ASCENDING)]),
+        # Recent-alert lookup when generating notifications
+        IndexModel([("type", ASCENDING), ("medicine_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("read", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "purchase_orders": [
+        IndexModel([("po_number", ASCENDING)], unique=True),
+        IndexModel([("supplier_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "revoked_tokens": [
+        IndexModel([("jti", ASCENDING)], unique=True),
+        # Entries are dropped once the token would have expired anyway
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "daily_rollups": [
+        IndexModel([("date", ASCENDING), ("medicine_id", ASCENDING)], unique=True),
+    ],
+    "predictions": [
+        # Stored forecasts, one per medicine; seeded sample predictions have no source
+        IndexModel(
+            [("medicine_id", ASCENDING)],
+            unique=True,
+            name="forecast_medicine_unique",
+            partialFilterExpression={"source": "forecast"}
+        ),
+    ],
+    "forecast_stats": [
+        # $merge in rebuild_forecast_stats matches on medicine_id
+        IndexModel([("medicine_id", ASCENDING)], unique=True),
+        # Medicines whose forecast has to be recomputed
+        IndexModel([("stale", ASCENDING)], name="stale_forecast_stats", partialFilterExpression={"stale": True}),
+    ],
+}
+
+# Keyset pagination sorts on (field, _id), so every paginated list gets a matching index
+for _collection, _field, _direction in PAGINATED_SORTS:
+    if _field != "_id":
+        INDEXES.setdefault(_collection, []).append(IndexModel([(_field, _direction), ("_id", _direction)]))
+
+
+class UniqueIndexError(Exception):
+    """Unique indexes the code relies on could not be built."""
+
+
+def _name(index: IndexModel) -> str:
+    return index.document["name"]
+
+
+async def ensure_indexes(db, collections: list = None):
+    """
+    Create every registered index (or only those of `collections`).
+
+    A plain index that cannot be built (e.g. an existing index with the same
+    keys but different options) is reported and skipped. If a unique index
+    cannot be built (usually duplicate values already stored) the remaining
+    indexes are still created and then UniqueIndexError is raised, since the
+    code would otherwise rely on a uniqueness that isn't enforced.
+    """
+    created = 0
+    failed = []
+    for collection, indexes in INDEXES.items():
+        if collections is not None and collection not in collections:
+            continue
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+                created += 1
+            except OperationFailure as e:
+                error = f"{collection}.{_name(index)}: {(e.details or {}).get('errmsg', e)}"
+                if index.document.get("unique"):
+                    print(f"❌ Could not create unique index {error}")
+                    failed.append(error)
+                else:
+                    print(f"⚠️  Could not create index {error}")
+    if failed:
+        raise UniqueIndexError(
+            "Unique indexes could not be built; remove the duplicate values and restart: " + "; ".join(failed)
+        )
+    return created
+
+
+async def index_report(db) -> dict:
+    """
+    Compare the registry with the database. Returns, per collection, the
+    registered indexes that are missing, the existing indexes the registry does
+    not declare, and the indexes with no recorded use since the server started.
+    """
+    report = {}
+    existing_collections = set(await db.list_collection_names())
+
+    for collection in sorted(set(INDEXES) | existing_collections):
+        if collection.startswith("system."):
+            continue
+        declared = {_name(index) for index in INDEXES.get(collection, [])}
+        existing = set()
+        unused = []
+
+        if collection in existing_collections:
+            existing = set(await db[collection].index_information()) - {"_id_"}
+            stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+            unused = sorted(
+                stat["name"] for stat in stats
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0
+            )
+
+        report[collection] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared),
+            "unused": unused
+        }
+    return report
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.database import MONGODB_URL, DATABASE_NAME
+
+    parser = argparse.ArgumentParser(description="Create or audit MongoDB indexes")
+    parser.add_argument("--report", action="store_true",
+                        help="List missing, undeclared and unused indexes instead of creating them")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        db = client[DATABASE_NAME]
+        if not args.report:
+            count = await ensure_indexes(db)
+            print(f"✅ Ensured {count} indexes")
+            return
+
+        for collection, entry in (await index_report(db)).items():
+            if not any(entry.values()):
+                continue
+            print(f"📂 {collection}")
+            for kind, icon in (("missing", "❌"), ("undeclared", "❔"), ("unused", "💤")):
+                for name in entry[kind]:
+                    print(f"   {icon} {kind}: {name}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
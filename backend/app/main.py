@@ -1,15 +1,34 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.database import connect_db, close_db
+from app.database import connect_db, close_db, get_database
+from app.indexes import ensure_indexes
+from app.pagination import NEXT_CURSOR_HEADER
+from app.services.date_migration import run_date_migration
+from app.services.forecast_runner import runner as forecast_runner
+from app.services.lots import run_lot_backfill
+from app.services.notification_hub import hub as notification_hub
+from app.services.tokens import load_token_secret
 from app.routes import medicines, sales, predictions, auth, customers, billing, reports, notifications, suppliers, purchase_orders
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Starting up...")
     await connect_db()
+    await ensure_indexes(get_database())
+    await load_token_secret(get_database())
+    # Medicines from before lot tracking get one lot holding their stock, and string
+    # timestamps become BSON dates, without holding up startup
+    lot_backfill = asyncio.create_task(run_lot_backfill(get_database()))
+    date_migration = asyncio.create_task(run_date_migration(get_database()))
+    await notification_hub.start(get_database())
     yield
     print("🛑 Shutting down...")
+    lot_backfill.cancel()
+    date_migration.cancel()
+    notification_hub.stop()
+    forecast_runner.shutdown()
     await close_db()
 
 app = FastAPI(title="Smart Pharmacy API", version="1.0.0", lifespan=lifespan)
@@ -21,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include routers
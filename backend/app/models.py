@@ -1,6 +1,10 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from pydantic import BaseModel, BeforeValidator, Field, EmailStr
+from typing import Annotated, Optional
 from datetime import datetime
+from app.dates import parse_datetime
+
+# Accepts "YYYY-MM-DD", "YYYY-MM-DD HH:MM:SS" or ISO 8601 and is stored as a BSON date
+Timestamp = Annotated[datetime, BeforeValidator(parse_datetime)]
 
 class User(BaseModel):
     email: EmailStr
@@ -8,7 +12,7 @@ class User(BaseModel):
     password: str
     full_name: str
     role: str = "pharmacist"  # admin, pharmacist, cashier
-    created_at: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    created_at: Timestamp = Field(default_factory=datetime.now)
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -26,7 +30,7 @@ class Medicine(BaseModel):
     batch_no: str
     quantity: int
     price: float
-    expiry_date: str
+    expiry_date: Timestamp
     category: str
     reorder_level: int = 50
 
@@ -35,7 +39,7 @@ class Sale(BaseModel):
     medicine_name: str
     quantity: int
     price: float
-    sale_date: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
+    sale_date: Timestamp = Field(default_factory=datetime.now)
     total: float
     user_email: Optional[str] = None
 
@@ -45,14 +49,18 @@ class Prediction(BaseModel):
     confidence: float
     date: str
 
+class PredictionQuery(BaseModel):
+    medicine_ids: list[str] = Field(..., min_length=1, max_length=1000)
+    horizon_days: int = Field(7, ge=1, le=365)
+
 class Customer(BaseModel):
     name: str
     email: Optional[str] = None
     phone: str
     address: Optional[str] = None
-    created_at: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    created_at: Timestamp = Field(default_factory=datetime.now)
     total_purchases: float = 0.0
-    last_purchase_date: Optional[str] = None
+    last_purchase_date: Optional[Timestamp] = None
 
 class CustomerUpdate(BaseModel):
     name: Optional[str] = None
@@ -68,7 +76,7 @@ class BillItem(BaseModel):
     total: float
 
 class Bill(BaseModel):
-    bill_number: str
+    bill_number: Optional[str] = None  # Allocated by the server when omitted
     customer_name: str
     customer_phone: Optional[str] = None
     customer_gstin: Optional[str] = None  # GST Identification Number
@@ -79,4 +87,4 @@ class Bill(BaseModel):
     gst_percentage: float = 18.0
     gst_amount: float
     grand_total: float
-    created_at: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
\ No newline at end of file
+    created_at: Timestamp = Field(default_factory=datetime.now)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by the endpoint's sort field plus `_id` as a tie-breaker, and
+the cursor for the next page is an opaque token encoding the last row's
+(sort value, _id). List endpoints return the page as a JSON array and the
+next cursor in the `X-Next-Cursor` response header (absent on the last page).
+"""
+
+import base64
+from datetime import datetime
+from bson import json_util
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+from app.dates import legacy_strings_remaining
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+
+# (collection, sort field, direction) for every paginated list; app.indexes registers a matching index
+PAGINATED_SORTS = [
+    ("medicines", "_id", ASCENDING),
+    ("sales", "sale_date", DESCENDING),
+    ("bills", "created_at", DESCENDING),
+    ("customers", "created_at", DESCENDING),
+    ("suppliers", "name", ASCENDING),
+    ("purchase_orders", "created_at", DESCENDING),
+]
+
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    key = [doc["_id"]] if sort_field == "_id" else [doc.get(sort_field), doc["_id"]]
+    return base64.urlsafe_b64encode(json_util.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_field: str) -> list:
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, list) or len(key) != (1 if sort_field == "_id" else 2):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def _after_query(key: list, sort_field: str, direction: int) -> dict:
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: key[0]}}
+
+    value, last_id = key
+    conditions = [{sort_field: value, "_id": {op: last_id}}]
+    if value is not None:
+        conditions.append({sort_field: {op: value}})
+        # Missing/null values sort after everything else in descending order
+        if direction == DESCENDING:
+            conditions.append({sort_field: None})
+            # Unmigrated string timestamps sort below BSON dates
+            if isinstance(value, datetime) and legacy_strings_remaining():
+                conditions.append({sort_field: {"$type": "string"}})
+    elif direction == ASCENDING:
+        conditions.append({sort_field: {"$ne": None}})
+    return {"$or": conditions}
+
+
+async def paginate(collection, query: dict, sort_field: str, direction: int, limit: int, after: str = None):
+    """Return (page, next_cursor) for `query` ordered by (sort_field, _id)."""
+    if after:
+        query = {"$and": [query, _after_query(decode_cursor(after, sort_field), sort_field, direction)]}
+
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    docs = await collection.find(query).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+
+def set_next_cursor(response, next_cursor: str):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
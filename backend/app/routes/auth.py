@@ -1,20 +1,19 @@
 from fastapi import APIRouter, HTTPException
 from app.database import get_database
 from app.models import User, UserLogin, UserResponse
-import hashlib
-import secrets
-from datetime import datetime, timedelta
+from app.services.passwords import hash_password, needs_rehash, verify_password
+from app.services.tokens import TokenError, decode_token, denylist, issue_token
 
 router = APIRouter()
 
-# Simple token storage (In production, use JWT with expiry)
-active_tokens = {}
-
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def generate_token() -> str:
-    return secrets.token_urlsafe(32)
+def generate_token(user: dict) -> str:
+    # Everything /verify returns travels in the signed token, so verifying needs no DB lookup
+    return issue_token({
+        "email": user["email"],
+        "username": user["username"],
+        "full_name": user["full_name"],
+        "role": user["role"]
+    })
 
 @router.post("/signup", response_model=UserResponse)
 async def signup(user: User):
@@ -27,18 +26,13 @@ async def signup(user: User):
     
     # Hash password
     user_dict = user.dict()
-    user_dict["password"] = hash_password(user.password)
+    user_dict["password"] = await hash_password(user.password)
     
     # Insert user
     result = await db.users.insert_one(user_dict)
     
     # Generate token
-    token = generate_token()
-    active_tokens[token] = {
-        "email": user.email,
-        "role": user.role,
-        "expires": datetime.now() + timedelta(days=7)
-    }
+    token = generate_token(user_dict)
     
     return UserResponse(
         email=user.email,
@@ -54,20 +48,21 @@ async def login(credentials: UserLogin):
     
     # Find user
     user = await db.users.find_one({"email": credentials.email})
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Verify password
-    if user["password"] != hash_password(credentials.password):
+    # Verify password (against a dummy hash for unknown emails, so timing doesn't reveal them)
+    valid = await verify_password(credentials.password, user["password"] if user else None)
+    if not user or not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Upgrade legacy SHA-256 (or outdated scrypt) hashes now that we have the password
+    if needs_rehash(user["password"]):
+        await db.users.update_one(
+            {"_id": user["_id"], "password": user["password"]},
+            {"$set": {"password": await hash_password(credentials.password)}}
+        )
+    
     # Generate token
-    token = generate_token()
-    active_tokens[token] = {
-        "email": user["email"],
-        "role": user["role"],
-        "expires": datetime.now() + timedelta(days=7)
-    }
+    token = generate_token(user)
     
     return UserResponse(
         email=user["email"],
@@ -79,26 +74,25 @@ async def login(credentials: UserLogin):
 
 @router.post("/logout")
 async def logout(token: str):
-    if token in active_tokens:
-        del active_tokens[token]
+    try:
+        await denylist.revoke(get_database(), decode_token(token))
+    except TokenError:
+        pass  # Invalid or expired tokens are already unusable
     return {"message": "Logged out successfully"}
 
 @router.get("/verify/{token}")
 async def verify_token(token: str):
-    if token not in active_tokens:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    
-    token_data = active_tokens[token]
-    if datetime.now() > token_data["expires"]:
-        del active_tokens[token]
-        raise HTTPException(status_code=401, detail="Token expired")
+    try:
+        claims = decode_token(token)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
     
-    db = get_database()
-    user = await db.users.find_one({"email": token_data["email"]})
+    if await denylist.is_revoked(get_database(), claims["jti"]):
+        raise HTTPException(status_code=401, detail="Token revoked")
     
     return {
-        "email": user["email"],
-        "username": user["username"],
-        "full_name": user["full_name"],
-        "role": user["role"]
+        "email": claims["email"],
+        "username": claims["username"],
+        "full_name": claims["full_name"],
+        "role": claims["role"]
     }
\ No newline at end of file
@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from app.database import get_database
+from app.dates import date_range_query
+from app.exports import export_response, CURSOR_BATCH_SIZE
+from app.pagination import paginate, set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.models import Bill
+from app.services.rollups import record_bill
+from app.services.forecasts import record_bill_stats
+from app.services.sequences import bill_numbers
+from app.services.stock import checkout, restore_stock, MedicineNotFoundError, InsufficientStockError
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
@@ -10,42 +19,75 @@ router = APIRouter()
 async def create_bill(bill: Bill):
     db = get_database()
     
-    # Validate and update stock for each item
-    for item in bill.items:
-        medicine = await db.medicines.find_one({"_id": ObjectId(item.medicine_id)})
-        
-        if not medicine:
-            raise HTTPException(status_code=404, detail=f"Medicine {item.medicine_name} not found")
-        
-        if medicine["quantity"] < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for {item.medicine_name}! Available: {medicine['quantity']}, Requested: {item.quantity}"
-            )
-        
-        # Reduce stock
-        await db.medicines.update_one(
-            {"_id": ObjectId(item.medicine_id)},
-            {"$inc": {"quantity": -item.quantity}}
-        )
+    # Take stock for every line and insert the bill, all or nothing
+    bill_dict = bill.dict()
+    if not bill_dict["bill_number"]:
+        bill_dict["bill_number"] = await bill_numbers.next(db)
+    try:
+        result = await checkout(db, bill_dict["items"], "bills", bill_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"Bill number {bill_dict['bill_number']} already exists")
+    except MedicineNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Insert bill
-    result = await db.bills.insert_one(bill.dict())
+    # Rollups and forecast statistics are derived data, kept outside the checkout: a failure
+    # here leaves them short by this bill until the next `python -m app.services.rollups` /
+    # `python -m app.services.forecasts` rebuild, but never loses or misstates stock
+    await record_bill(db, bill_dict)
+    await record_bill_stats(db, bill_dict)
     
     return {
         "id": str(result.inserted_id),
-        "bill_number": bill.bill_number,
+        "bill_number": bill_dict["bill_number"],
         "message": "Bill created successfully"
     }
 
 @router.get("/")
-async def get_bills():
+async def get_bills(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+):
     db = get_database()
-    bills = await db.bills.find().sort("created_at", -1).to_list(1000)
+    bills, next_cursor = await paginate(db.bills, {}, "created_at", -1, limit, after)
+    set_next_cursor(response, next_cursor)
     for bill in bills:
         bill["_id"] = str(bill["_id"])
     return bills
 
+# Bill fields copied as-is onto every exported line item row
+BILL_HEADER_COLUMNS = (
+    "bill_number", "created_at", "customer_name", "customer_phone", "customer_gstin",
+    "payment_mode", "subtotal", "gst_percentage", "gst_amount", "grand_total"
+)
+BILL_ITEM_COLUMNS = ("item_medicine_id", "item_medicine_name", "item_quantity", "item_price", "item_total")
+BILL_EXPORT_COLUMNS = ["bill_id", *BILL_HEADER_COLUMNS, *BILL_ITEM_COLUMNS]
+
+@router.get("/export")
+async def export_bills(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    format: str = Query("ndjson", description="Export format: ndjson or csv")
+):
+    db = get_database()
+    cursor = db.bills.find(
+        date_range_query("created_at", start_date, end_date)
+    ).sort([("created_at", 1), ("_id", 1)]).batch_size(CURSOR_BATCH_SIZE)
+    
+    # One row per line item, carrying the bill's header fields
+    async def rows():
+        async for bill in cursor:
+            header = {
+                "bill_id": str(bill["_id"]),
+                **{column: bill.get(column) for column in BILL_HEADER_COLUMNS}
+            }
+            for item in bill.get("items", []):
+                yield {**header, **{f"item_{key}": value for key, value in item.items()}}
+    
+    return export_response(rows(), BILL_EXPORT_COLUMNS, format, "bills")
+
 @router.get("/{bill_id}")
 async def get_bill(bill_id: str):
     db = get_database()
@@ -66,25 +108,42 @@ async def delete_bill(bill_id: str):
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
     
-    # Restore stock for each item
-    for item in bill["items"]:
-        await db.medicines.update_one(
-            {"_id": ObjectId(item["medicine_id"])},
-            {"$inc": {"quantity": item["quantity"]}}
-        )
+    # Restore stock for all items, into the lots they were drawn from
+    await restore_stock(db, bill["items"], bill.get("lots"))
     
     # Delete the bill
     await db.bills.delete_one({"_id": ObjectId(bill_id)})
+    await record_bill(db, bill, sign=-1)
+    await record_bill_stats(db, bill, sign=-1)
     
     return {"message": "Bill deleted successfully"}
 
 @router.get("/stats/summary")
-async def get_bill_stats():
+async def get_bill_stats(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    payment_mode: Optional[str] = Query(None, description="Payment mode: Cash, Card, UPI")
+):
     db = get_database()
-    bills = await db.bills.find().to_list(10000)
     
-    total_bills = len(bills)
-    total_revenue = sum(bill.get("grand_total", 0) for bill in bills)
+    # Build query
+    query = date_range_query("created_at", start_date, end_date)
+    if payment_mode:
+        query["payment_mode"] = payment_mode
+    
+    # Totals are computed server-side, so they stay exact at any collection size
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total_bills": {"$sum": 1},
+            "total_revenue": {"$sum": {"$ifNull": ["$grand_total", 0]}}
+        }}
+    ]
+    result = await db.bills.aggregate(pipeline).to_list(length=1)
+    
+    total_bills = result[0]["total_bills"] if result else 0
+    total_revenue = result[0]["total_revenue"] if result else 0
     avg_bill_value = total_revenue / total_bills if total_bills > 0 else 0
     
     return {
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from app.database import get_database
+from app.pagination import paginate, set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.models import Customer, CustomerUpdate
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 
@@ -15,13 +18,22 @@ async def add_customer(customer: Customer):
     if existing:
         raise HTTPException(status_code=400, detail="Customer with this phone already exists")
     
-    result = await db.customers.insert_one(customer.dict())
+    try:
+        result = await db.customers.insert_one(customer.dict())
+    except DuplicateKeyError:
+        # Another request registered the phone since the check above
+        raise HTTPException(status_code=400, detail="Customer with this phone already exists")
     return {"id": str(result.inserted_id), "message": "Customer added successfully"}
 
 @router.get("/")
-async def get_customers():
+async def get_customers(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+):
     db = get_database()
-    customers = await db.customers.find().sort("created_at", -1).to_list(1000)
+    customers, next_cursor = await paginate(db.customers, {}, "created_at", -1, limit, after)
+    set_next_cursor(response, next_cursor)
     for customer in customers:
         customer["_id"] = str(customer["_id"])
     return customers
@@ -40,10 +52,13 @@ async def update_customer(customer_id: str, customer: CustomerUpdate):
     db = get_database()
     update_data = {k: v for k, v in customer.dict().items() if v is not None}
     
-    result = await db.customers.update_one(
-        {"_id": ObjectId(customer_id)},
-        {"$set": update_data}
-    )
+    try:
+        result = await db.customers.update_one(
+            {"_id": ObjectId(customer_id)},
+            {"$set": update_data}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Customer with this phone already exists")
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
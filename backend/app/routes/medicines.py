@@ -1,21 +1,34 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from app.database import get_database
+from app.dates import date_range_query, parse_datetime
+from app.pagination import paginate, set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.models import Medicine
+from app.services.lots import FEFO_SORT, backfill_medicines, lot_expiry, lot_increment, open_lots_query, refresh_heads
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 
 router = APIRouter()
 
 @router.post("/")
 async def add_medicine(medicine: Medicine):
     db = get_database()
-    result = await db.medicines.insert_one(medicine.dict())
+    result = await db.medicines.insert_one({**medicine.dict(), "lots_tracked": True})
+    # The opening stock is the medicine's first lot
+    await db.lots.bulk_write([
+        lot_increment(str(result.inserted_id), medicine.batch_no, medicine.expiry_date, medicine.quantity)
+    ])
     return {"id": str(result.inserted_id), "message": "Medicine added"}
 
 @router.get("/")
-async def get_medicines():
+async def get_medicines(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+):
     db = get_database()
-    medicines = await db.medicines.find().to_list(1000)
+    medicines, next_cursor = await paginate(db.medicines, {}, "_id", 1, limit, after)
+    set_next_cursor(response, next_cursor)
     for med in medicines:
         med["_id"] = str(med["_id"])
     return medicines
@@ -23,29 +36,88 @@ async def get_medicines():
 @router.get("/expiring")
 async def get_expiring_medicines():
     db = get_database()
-    medicines = await db.medicines.find().to_list(1000)
-    expiring = []
     today = datetime.now()
+    # One row per lot expiring in the next 90 days (partial expiry_date index on open lots)
+    expiring_lots = await db.lots.find(
+        {"quantity": {"$gt": 0}, **date_range_query("expiry_date", today, today + timedelta(days=90))}
+    ).sort(FEFO_SORT).to_list(1000)
+    ids = list({ObjectId(lot["medicine_id"]) for lot in expiring_lots})
+    medicines = {str(med["_id"]): med for med in await db.medicines.find({"_id": {"$in": ids}}).to_list(length=None)}
+    expiring = []
     
-    for med in medicines:
-        exp_date = datetime.strptime(med["expiry_date"], "%Y-%m-%d")
-        days_left = (exp_date - today).days
-        if 0 < days_left <= 90:
-            med["_id"] = str(med["_id"])
-            med["days_until_expiry"] = days_left
-            expiring.append(med)
+    for lot in expiring_lots:
+        med = medicines.get(lot["medicine_id"])
+        days_left = (parse_datetime(lot["expiry_date"]) - today).days
+        if med and 0 < days_left <= 90:
+            expiring.append({
+                **med,
+                "_id": str(med["_id"]),
+                "lot_id": str(lot["_id"]),
+                "batch_no": lot.get("batch_no"),
+                "expiry_date": lot["expiry_date"],
+                "quantity": lot["quantity"],
+                "days_until_expiry": days_left
+            })
     
-    return sorted(expiring, key=lambda x: x["days_until_expiry"])
+    return expiring
+
+@router.get("/{medicine_id}/lots")
+async def get_medicine_lots(medicine_id: str):
+    db = get_database()
+    # Open lots in the order sales draw from them (earliest expiry first)
+    medicine_lots = await db.lots.find(open_lots_query(medicine_id)).sort(FEFO_SORT).to_list(1000)
+    for lot in medicine_lots:
+        lot["_id"] = str(lot["_id"])
+    return medicine_lots
 
 @router.put("/{medicine_id}")
 async def update_medicine(medicine_id: str, medicine: Medicine):
     db = get_database()
-    result = await db.medicines.update_one(
+    # A medicine from before lot tracking gets its lot first, so the edit below applies to it
+    await backfill_medicines(db, [medicine_id])
+    existing = await db.medicines.find_one({"_id": ObjectId(medicine_id)}, {"quantity": 1, "batch_no": 1, "expiry_date": 1})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Medicine not found")
+    
+    medicine_dict = medicine.dict()
+    # The form edits the earliest lot: an unknown batch/expiry relabels that lot,
+    # and the change in total quantity is added to or taken from the named lot
+    quantity = medicine_dict.pop("quantity")
+    now = datetime.now()
+    lot_key = {"medicine_id": medicine_id, "batch_no": medicine.batch_no, "expiry_date": medicine.expiry_date}
+    target, relabel = lot_key, {}
+    if not await db.lots.find_one(lot_key, {"_id": 1}):
+        target = {
+            "medicine_id": medicine_id,
+            "batch_no": existing.get("batch_no"),
+            "expiry_date": lot_expiry(existing.get("expiry_date"))
+        }
+        relabel = {"batch_no": medicine.batch_no, "expiry_date": medicine.expiry_date}
+    
+    # The relabel and the quantity change are one update, so a rejected edit writes nothing
+    delta = quantity - existing.get("quantity", 0)
+    if delta < 0:
+        result = await db.lots.update_one(
+            {**target, "quantity": {"$gte": -delta}},
+            {"$inc": {"quantity": delta}, "$set": {**relabel, "updated_at": now}}
+        )
+        if result.matched_count == 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch {medicine.batch_no} holds fewer than {-delta} units"
+            )
+    elif relabel:
+        result = await db.lots.update_one(target, {"$inc": {"quantity": delta}, "$set": {**relabel, "updated_at": now}})
+        if result.matched_count == 0 and delta > 0:
+            await db.lots.bulk_write([lot_increment(medicine_id, medicine.batch_no, medicine.expiry_date, delta, now)])
+    elif delta > 0:
+        await db.lots.bulk_write([lot_increment(medicine_id, medicine.batch_no, medicine.expiry_date, delta, now)])
+    
+    await db.medicines.update_one(
         {"_id": ObjectId(medicine_id)},
-        {"$set": medicine.dict()}
+        {"$set": medicine_dict, "$inc": {"quantity": delta}}
     )
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Medicine not found")
+    await refresh_heads(db, [medicine_id])
     return {"message": "Medicine updated"}
 
 @router.delete("/{medicine_id}")
@@ -54,4 +126,5 @@ async def delete_medicine(medicine_id: str):
     result = await db.medicines.delete_one({"_id": ObjectId(medicine_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Medicine not found")
-    return {"message": "Medicine deleted"}
\ No newline at end of file
+    await db.lots.delete_many({"medicine_id": medicine_id})
+    return {"message": "Medicine deleted"}
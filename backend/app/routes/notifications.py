@@ -1,11 +1,56 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.database import get_database
+from app.dates import date_query, parse_datetime
+from app.services.notification_hub import hub, format_sse
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
 from typing import Optional
+import asyncio
+import time
 
 router = APIRouter()
 
+# Short-lived cache for the summary endpoint, invalidated whenever notifications change
+SUMMARY_CACHE_TTL = 5  # seconds
+_summary_cache = {"value": None, "expires": 0.0, "version": 0}
+
+
+def invalidate_summary_cache():
+    _summary_cache["value"] = None
+    _summary_cache["version"] += 1
+
+
+# Seconds between keep-alive comments on idle notification streams
+STREAM_KEEPALIVE = 15
+# Changes within this many seconds share one unread-count push
+UNREAD_COUNT_DEBOUNCE = 0.5
+_unread_count_push = {"task": None}
+
+
+def publish_unread_count(db):
+    """
+    Schedule a push of the unread count to streaming clients on every worker.
+
+    A burst of changes (e.g. marking many notifications read one by one)
+    costs one count and one event instead of one per change.
+    """
+    task = _unread_count_push["task"]
+    if task is None or task.done():
+        _unread_count_push["task"] = asyncio.create_task(_push_unread_count(db))
+
+
+async def _push_unread_count(db):
+    await asyncio.sleep(UNREAD_COUNT_DEBOUNCE)
+    # Later changes schedule a new push
+    _unread_count_push["task"] = None
+    try:
+        count = await db.notifications.count_documents({"read": False})
+        await hub.publish("unread_count", {"unread_count": count})
+    except PyMongoError as e:
+        print(f"⚠️  Could not publish unread count: {e}")
+
 
 @router.get("/")
 async def get_notifications(
@@ -55,6 +100,58 @@ async def get_unread_count():
         raise HTTPException(status_code=500, detail=f"Error counting notifications: {str(e)}")
 
 
+@router.get("/stream")
+async def stream_notifications():
+    """
+    Server-Sent Events stream of new notifications and unread-count updates.
+    """
+    db = get_database()
+    unread_count = await db.notifications.count_documents({"read": False})
+    queue = hub.subscribe()
+    
+    async def events():
+        try:
+            yield format_sse("unread_count", {"unread_count": unread_count})
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            hub.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Dedupe window (in days) for each generated notification type
+DEDUPE_WINDOWS = {
+    "low_stock": 1,
+    "out_of_stock": 1,
+    "expired": 7,
+    "expiring_soon": 7
+}
+
+
+def _build_notification(today: datetime, type_: str, priority: str, title: str, message: str,
+                        med_id: str, med_name: str) -> dict:
+    window = today.toordinal() // DEDUPE_WINDOWS[type_]
+    return {
+        "type": type_,
+        "priority": priority,
+        "title": title,
+        "message": message,
+        "medicine_id": med_id,
+        "medicine_name": med_name,
+        "read": False,
+        "created_at": today,
+        "dedupe_key": f"{type_}:{med_id}:{window}"
+    }
+
+
 @router.post("/generate")
 async def generate_notifications():
     """
@@ -65,11 +162,39 @@ async def generate_notifications():
     
     try:
         # Get all medicines
-        medicines_cursor = db.medicines.find()
+        medicines_cursor = db.medicines.find(
+            {},
+            {"name": 1, "quantity": 1, "reorder_level": 1, "expiry_date": 1}
+        )
         medicines = await medicines_cursor.to_list(length=10000)
         
         today = datetime.now()
-        notifications_created = 0
+        
+        # Fetch every recent notification key in one query
+        cutoffs = {
+            type_: today - timedelta(days=days)
+            for type_, days in DEDUPE_WINDOWS.items()
+        }
+        recent_cursor = db.notifications.find(
+            {
+                "type": {"$in": list(DEDUPE_WINDOWS)},
+                **date_query("created_at", {"$gte": min(cutoffs.values())})
+            },
+            {"type": 1, "medicine_id": 1, "created_at": 1, "_id": 0}
+        )
+        recent_keys = {
+            (notif["type"], notif.get("medicine_id"))
+            async for notif in recent_cursor
+            if parse_datetime(notif["created_at"]) >= cutoffs[notif["type"]]
+        }
+        
+        new_notifications = []
+        
+        def add(type_: str, priority: str, title: str, message: str, med_id: str, med_name: str):
+            if (type_, med_id) not in recent_keys:
+                new_notifications.append(
+                    _build_notification(today, type_, priority, title, message, med_id, med_name)
+                )
         
         for med in medicines:
             med_id = str(med["_id"])
@@ -79,103 +204,65 @@ async def generate_notifications():
             
             # Check for low stock
             if quantity < reorder_level and quantity > 0:
-                # Check if notification already exists for this medicine (within last 24 hours)
-                existing = await db.notifications.find_one({
-                    "type": "low_stock",
-                    "medicine_id": med_id,
-                    "created_at": {"$gte": (today - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")}
-                })
-                
-                if not existing:
-                    notification = {
-                        "type": "low_stock",
-                        "priority": "warning",
-                        "title": "Low Stock Alert",
-                        "message": f"{med_name} is running low. Current stock: {quantity}, Reorder level: {reorder_level}",
-                        "medicine_id": med_id,
-                        "medicine_name": med_name,
-                        "read": False,
-                        "created_at": today.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    await db.notifications.insert_one(notification)
-                    notifications_created += 1
+                add(
+                    "low_stock", "warning", "Low Stock Alert",
+                    f"{med_name} is running low. Current stock: {quantity}, Reorder level: {reorder_level}",
+                    med_id, med_name
+                )
             
             # Check for out of stock
             elif quantity == 0:
-                existing = await db.notifications.find_one({
-                    "type": "out_of_stock",
-                    "medicine_id": med_id,
-                    "created_at": {"$gte": (today - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")}
-                })
-                
-                if not existing:
-                    notification = {
-                        "type": "out_of_stock",
-                        "priority": "critical",
-                        "title": "Out of Stock",
-                        "message": f"{med_name} is out of stock. Immediate reorder required!",
-                        "medicine_id": med_id,
-                        "medicine_name": med_name,
-                        "read": False,
-                        "created_at": today.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    await db.notifications.insert_one(notification)
-                    notifications_created += 1
+                add(
+                    "out_of_stock", "critical", "Out of Stock",
+                    f"{med_name} is out of stock. Immediate reorder required!",
+                    med_id, med_name
+                )
             
             # Check for expiring medicines
-            expiry_str = med.get("expiry_date", "")
-            if expiry_str:
-                try:
-                    expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d")
-                    days_to_expiry = (expiry_date - today).days
-                    
-                    # Expired
-                    if days_to_expiry < 0:
-                        existing = await db.notifications.find_one({
-                            "type": "expired",
-                            "medicine_id": med_id,
-                            "created_at": {"$gte": (today - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")}
-                        })
-                        
-                        if not existing:
-                            notification = {
-                                "type": "expired",
-                                "priority": "critical",
-                                "title": "Medicine Expired",
-                                "message": f"{med_name} has expired. Remove from inventory immediately!",
-                                "medicine_id": med_id,
-                                "medicine_name": med_name,
-                                "read": False,
-                                "created_at": today.strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            await db.notifications.insert_one(notification)
-                            notifications_created += 1
-                    
-                    # Expiring within 30 days
-                    elif days_to_expiry <= 30:
-                        existing = await db.notifications.find_one({
-                            "type": "expiring_soon",
-                            "medicine_id": med_id,
-                            "created_at": {"$gte": (today - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")}
-                        })
-                        
-                        if not existing:
-                            priority = "critical" if days_to_expiry <= 7 else "warning"
-                            notification = {
-                                "type": "expiring_soon",
-                                "priority": priority,
-                                "title": "Medicine Expiring Soon",
-                                "message": f"{med_name} will expire in {days_to_expiry} days (Expiry: {expiry_str})",
-                                "medicine_id": med_id,
-                                "medicine_name": med_name,
-                                "read": False,
-                                "created_at": today.strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            await db.notifications.insert_one(notification)
-                            notifications_created += 1
+            try:
+                expiry_date = parse_datetime(med.get("expiry_date"))
+            except ValueError:
+                expiry_date = None
+            if expiry_date:
+                days_to_expiry = (expiry_date - today).days
+                
+                # Expired
+                if days_to_expiry < 0:
+                    add(
+                        "expired", "critical", "Medicine Expired",
+                        f"{med_name} has expired. Remove from inventory immediately!",
+                        med_id, med_name
+                    )
                 
-                except ValueError:
-                    pass
+                # Expiring within 30 days
+                elif days_to_expiry <= 30:
+                    add(
+                        "expiring_soon", "critical" if days_to_expiry <= 7 else "warning",
+                        "Medicine Expiring Soon",
+                        f"{med_name} will expire in {days_to_expiry} days (Expiry: {expiry_date:%Y-%m-%d})",
+                        med_id, med_name
+                    )
+        
+        # Insert all new alerts at once; duplicates from a concurrent run are rejected by the unique index
+        notifications_created = 0
+        if new_notifications:
+            rejected = set()
+            try:
+                await db.notifications.insert_many(new_notifications, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                # Only duplicate-key rejections are expected; anything else is a real failure
+                if any(error.get("code") != 11000 for error in errors):
+                    invalidate_summary_cache()
+                    raise
+                rejected = {error["index"] for error in errors}
+            invalidate_summary_cache()
+            
+            created = [n for i, n in enumerate(new_notifications) if i not in rejected]
+            notifications_created = len(created)
+            if created:
+                await hub.publish_many("notification", [{**n, "_id": str(n["_id"])} for n in created])
+            publish_unread_count(db)
         
         return {
             "message": f"Generated {notifications_created} new notifications",
@@ -196,8 +283,10 @@ async def mark_as_read(notification_id: str):
     try:
         result = await db.notifications.update_one(
             {"_id": ObjectId(notification_id)},
-            {"$set": {"read": True, "read_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}}
+            {"$set": {"read": True, "read_at": datetime.now()}}
         )
+        invalidate_summary_cache()
+        publish_unread_count(db)
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Notification not found")
@@ -218,8 +307,10 @@ async def mark_all_as_read():
     try:
         result = await db.notifications.update_many(
             {"read": False},
-            {"$set": {"read": True, "read_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}}
+            {"$set": {"read": True, "read_at": datetime.now()}}
         )
+        invalidate_summary_cache()
+        publish_unread_count(db)
         
         return {
             "message": f"Marked {result.modified_count} notifications as read",
@@ -239,6 +330,8 @@ async def delete_notification(notification_id: str):
     
     try:
         result = await db.notifications.delete_one({"_id": ObjectId(notification_id)})
+        invalidate_summary_cache()
+        publish_unread_count(db)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Notification not found")
@@ -273,34 +366,50 @@ async def get_notification_summary():
     """
     Get summary of notifications by type and priority.
     """
+    now = time.monotonic()
+    if _summary_cache["value"] is not None and now < _summary_cache["expires"]:
+        return _summary_cache["value"]
+    version = _summary_cache["version"]
+    
     db = get_database()
     
     try:
-        # Count by priority
-        critical_count = await db.notifications.count_documents({"priority": "critical", "read": False})
-        warning_count = await db.notifications.count_documents({"priority": "warning", "read": False})
-        info_count = await db.notifications.count_documents({"priority": "info", "read": False})
+        # Count unread by priority and by type in a single aggregation
+        pipeline = [
+            {"$match": {"read": False}},
+            {"$facet": {
+                "by_priority": [{"$group": {"_id": "$priority", "count": {"$sum": 1}}}],
+                "by_type": [{"$group": {"_id": "$type", "count": {"$sum": 1}}}]
+            }}
+        ]
+        facets = (await db.notifications.aggregate(pipeline).to_list(length=1))[0]
+        by_priority = {group["_id"]: group["count"] for group in facets["by_priority"]}
+        by_type = {group["_id"]: group["count"] for group in facets["by_type"]}
         
-        # Count by type
-        low_stock_count = await db.notifications.count_documents({"type": "low_stock", "read": False})
-        out_of_stock_count = await db.notifications.count_documents({"type": "out_of_stock", "read": False})
-        expiring_count = await db.notifications.count_documents({"type": "expiring_soon", "read": False})
-        expired_count = await db.notifications.count_documents({"type": "expired", "read": False})
+        critical_count = by_priority.get("critical", 0)
+        warning_count = by_priority.get("warning", 0)
+        info_count = by_priority.get("info", 0)
         
-        return {
+        summary = {
             "by_priority": {
                 "critical": critical_count,
                 "warning": warning_count,
                 "info": info_count
             },
             "by_type": {
-                "low_stock": low_stock_count,
-                "out_of_stock": out_of_stock_count,
-                "expiring_soon": expiring_count,
-                "expired": expired_count
+                "low_stock": by_type.get("low_stock", 0),
+                "out_of_stock": by_type.get("out_of_stock", 0),
+                "expiring_soon": by_type.get("expiring_soon", 0),
+                "expired": by_type.get("expired", 0)
             },
             "total_unread": critical_count + warning_count + info_count
         }
+        
+        # Don't cache a result that raced with an invalidation
+        if _summary_cache["version"] == version:
+            _summary_cache["value"] = summary
+            _summary_cache["expires"] = now + SUMMARY_CACHE_TTL
+        return summary
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching notification summary: {str(e)}")
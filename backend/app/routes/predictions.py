@@ -1,16 +1,42 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from app.database import get_database
-from app.services.ml_model import predict_demand
+from app.models import PredictionQuery
+from app.services.forecast_runner import runner
+from app.services.forecasts import forecast_medicines
 
 router = APIRouter()
 
 @router.get("/")
 async def get_predictions():
     db = get_database()
-    sales = await db.sales.find().to_list(10000)
+    predictions = await runner.latest_forecasts(db)
     
-    if len(sales) < 7:
+    if predictions is None:
         return {"message": "Not enough data for predictions (need at least 7 sales)"}
     
-    predictions = predict_demand(sales)
-    return predictions
\ No newline at end of file
+    return predictions
+
+@router.post("/query")
+async def query_predictions(query: PredictionQuery):
+    db = get_database()
+    predictions = await forecast_medicines(db, query.medicine_ids, query.horizon_days)
+    
+    found = {prediction["medicine_id"] for prediction in predictions}
+    return {
+        "horizon_days": query.horizon_days,
+        "predictions": predictions,
+        "insufficient_data": [med_id for med_id in query.medicine_ids if med_id not in found]
+    }
+
+@router.get("/{medicine_id}")
+async def get_medicine_prediction(
+    medicine_id: str,
+    horizon_days: int = Query(7, ge=1, le=365, description="Forecast horizon in days")
+):
+    db = get_database()
+    predictions = await forecast_medicines(db, [medicine_id], horizon_days)
+    
+    if not predictions:
+        raise HTTPException(status_code=404, detail="Not enough sales data for this medicine (need at least 3 sales)")
+    
+    return {**predictions[0], "horizon_days": horizon_days}
\ No newline at end of file
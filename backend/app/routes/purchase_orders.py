@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from app.database import get_database
+from app.dates import coerce_dates, date_range_query
+from app.services.receiving import receive, ReceiptError, ReceiptConflictError, RECEIVABLE_STATUSES
+from app.services.sequences import po_numbers
+from app.services.stock import MedicineNotFoundError
+from app.services.supplier_cache import supplier_cache
+from app.pagination import paginate, set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from typing import Optional
 
 router = APIRouter()
@@ -9,10 +16,13 @@ router = APIRouter()
 
 @router.get("/")
 async def get_purchase_orders(
+    response: Response,
     status: Optional[str] = None,
     supplier_id: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
 ):
     """
     Get all purchase orders with optional filters.
@@ -26,30 +36,23 @@ async def get_purchase_orders(
             query["status"] = status
         if supplier_id:
             query["supplier_id"] = supplier_id
-        if start_date:
-            query["order_date"] = query.get("order_date", {})
-            query["order_date"]["$gte"] = start_date
-        if end_date:
-            query["order_date"] = query.get("order_date", {})
-            query["order_date"]["$lte"] = end_date
+        query.update(date_range_query("order_date", start_date, end_date))
         
         # Fetch purchase orders
-        po_cursor = db.purchase_orders.find(query).sort("created_at", -1)
-        purchase_orders = await po_cursor.to_list(length=1000)
+        purchase_orders, next_cursor = await paginate(db.purchase_orders, query, "created_at", -1, limit, after)
+        set_next_cursor(response, next_cursor)
         
-        # Convert ObjectId to string and fetch supplier names
+        # Resolve every supplier name at once (cached, one $in query for any misses)
+        suppliers = await supplier_cache.get_many(db, [po.get("supplier_id") for po in purchase_orders])
         for po in purchase_orders:
             po["_id"] = str(po["_id"])
-            
-            # Get supplier name
-            supplier = await db.suppliers.find_one({"_id": ObjectId(po["supplier_id"])})
-            if supplier:
-                po["supplier_name"] = supplier.get("name", "Unknown")
-            else:
-                po["supplier_name"] = "Unknown"
+            supplier = suppliers.get(po.get("supplier_id"))
+            po["supplier_name"] = supplier.get("name", "Unknown") if supplier else "Unknown"
         
         return purchase_orders
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching purchase orders: {str(e)}")
 
@@ -70,13 +73,15 @@ async def get_purchase_order(po_id: str):
         po["_id"] = str(po["_id"])
         
         # Get supplier details
-        supplier = await db.suppliers.find_one({"_id": ObjectId(po["supplier_id"])})
+        supplier = await supplier_cache.get(db, po["supplier_id"])
         if supplier:
             po["supplier_name"] = supplier.get("name", "Unknown")
             po["supplier_contact"] = supplier.get("phone", "")
         
         return po
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching purchase order: {str(e)}")
 
@@ -90,13 +95,12 @@ async def create_purchase_order(po: dict):
     
     try:
         # Verify supplier exists
-        supplier = await db.suppliers.find_one({"_id": ObjectId(po["supplier_id"])})
+        supplier = await supplier_cache.get(db, po["supplier_id"])
         if not supplier:
             raise HTTPException(status_code=404, detail="Supplier not found")
         
         # Generate PO number
-        po_count = await db.purchase_orders.count_documents({})
-        po["po_number"] = f"PO-{datetime.now().strftime('%Y%m%d')}-{po_count + 1:04d}"
+        po["po_number"] = await po_numbers.next(db)
         
         # Calculate total amount
         total_amount = 0
@@ -107,19 +111,27 @@ async def create_purchase_order(po: dict):
         
         po["total_amount"] = total_amount
         po["status"] = "pending"
-        po["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        po["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        po["order_date"] = po.get("order_date", datetime.now().strftime("%Y-%m-%d"))
-        
-        # Insert purchase order
-        result = await db.purchase_orders.insert_one(po)
+        coerce_dates(po, "purchase_orders")
+        po["created_at"] = po["updated_at"] = datetime.now()
+        po["order_date"] = po.get("order_date") or po["created_at"]
+        
+        # Insert purchase order, skipping numbers already taken by POs numbered before the counter existed
+        while True:
+            try:
+                result = await db.purchase_orders.insert_one(po)
+                break
+            except DuplicateKeyError as e:
+                if "po_number" not in (e.details or {}).get("keyPattern", {}):
+                    raise
+                po.pop("_id", None)
+                po["po_number"] = await po_numbers.next(db)
         
         # Update supplier statistics
         await db.suppliers.update_one(
             {"_id": ObjectId(po["supplier_id"])},
             {
                 "$inc": {"total_orders": 1},
-                "$set": {"updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+                "$set": {"updated_at": datetime.now()}
             }
         )
         
@@ -130,6 +142,8 @@ async def create_purchase_order(po: dict):
         
         return created_po
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating purchase order: {str(e)}")
 
@@ -162,8 +176,10 @@ async def update_purchase_order(po_id: str, po_data: dict):
                 total_amount += item_total
             po_data["total_amount"] = total_amount
         
+        coerce_dates(po_data, "purchase_orders")
+        
         # Update timestamp
-        po_data["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        po_data["updated_at"] = datetime.now()
         
         # Update PO
         result = await db.purchase_orders.update_one(
@@ -207,8 +223,8 @@ async def approve_purchase_order(po_id: str, approval_data: dict):
                 "$set": {
                     "status": "approved",
                     "approved_by": approval_data.get("approved_by", "Admin"),
-                    "approved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "approved_at": datetime.now(),
+                    "updated_at": datetime.now(),
                     "approval_notes": approval_data.get("notes", "")
                 }
             }
@@ -240,62 +256,16 @@ async def receive_purchase_order(po_id: str, receive_data: dict):
         if not po:
             raise HTTPException(status_code=404, detail="Purchase order not found")
         
-        if po.get("status") not in ["approved"]:
-            raise HTTPException(status_code=400, detail=f"Can only receive approved POs. Current status: {po.get('status')}")
-        
-        # Update inventory for each item
-        items_received = receive_data.get("items_received", [])
-        
-        for item in items_received:
-            medicine_id = item.get("medicine_id")
-            quantity_received = item.get("quantity_received", 0)
-            batch_number = item.get("batch_number", "")
-            
-            if quantity_received > 0:
-                # Find medicine
-                medicine = await db.medicines.find_one({"_id": ObjectId(medicine_id)})
-                
-                if medicine:
-                    # Update quantity
-                    new_quantity = medicine.get("quantity", 0) + quantity_received
-                    
-                    update_data = {
-                        "quantity": new_quantity,
-                        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    
-                    # Update batch number if provided
-                    if batch_number:
-                        update_data["batch_number"] = batch_number
-                    
-                    await db.medicines.update_one(
-                        {"_id": ObjectId(medicine_id)},
-                        {"$set": update_data}
-                    )
-        
-        # Update PO status
-        result = await db.purchase_orders.update_one(
-            {"_id": ObjectId(po_id)},
-            {
-                "$set": {
-                    "status": "received",
-                    "received_by": receive_data.get("received_by", "Admin"),
-                    "received_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "items_received": items_received,
-                    "receive_notes": receive_data.get("notes", ""),
-                    "payment_status": receive_data.get("payment_status", "pending")
-                }
-            }
-        )
+        if po.get("status") not in RECEIVABLE_STATUSES:
+            raise HTTPException(status_code=400, detail=f"Can only receive approved or partially received POs. Current status: {po.get('status')}")
         
-        # Update supplier total amount
-        await db.suppliers.update_one(
-            {"_id": ObjectId(po["supplier_id"])},
-            {
-                "$inc": {"total_amount": po.get("total_amount", 0)},
-                "$set": {"updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-            }
+        # Book the delivery: one bulk $inc for stock plus the PO and supplier updates
+        status = await receive(
+            db, po,
+            receive_data.get("items_received") or receive_data.get("items", []),
+            received_by=receive_data.get("received_by", "Admin"),
+            notes=receive_data.get("notes", ""),
+            payment_status=receive_data.get("payment_status", "pending")
         )
         
         # Fetch updated PO
@@ -303,10 +273,19 @@ async def receive_purchase_order(po_id: str, receive_data: dict):
         updated_po["_id"] = str(updated_po["_id"])
         
         return {
-            "message": "Purchase order received and inventory updated",
+            "message": "Purchase order received and inventory updated" if status == "received"
+                       else "Partial delivery received and inventory updated",
             "purchase_order": updated_po
         }
     
+    except HTTPException:
+        raise
+    except MedicineNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ReceiptError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ReceiptConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error receiving purchase order: {str(e)}")
 
@@ -334,8 +313,8 @@ async def cancel_purchase_order(po_id: str, cancel_data: dict):
                 "$set": {
                     "status": "cancelled",
                     "cancelled_by": cancel_data.get("cancelled_by", "Admin"),
-                    "cancelled_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "cancelled_at": datetime.now(),
+                    "updated_at": datetime.now(),
                     "cancellation_reason": cancel_data.get("reason", "")
                 }
             }
@@ -394,15 +373,16 @@ async def get_po_statistics():
         total_pos = await db.purchase_orders.count_documents({})
         pending = await db.purchase_orders.count_documents({"status": "pending"})
         approved = await db.purchase_orders.count_documents({"status": "approved"})
+        partially_received = await db.purchase_orders.count_documents({"status": "partially_received"})
         received = await db.purchase_orders.count_documents({"status": "received"})
         cancelled = await db.purchase_orders.count_documents({"status": "cancelled"})
         
-        # Calculate total amount (received orders only)
+        # Calculate total amount received (POs received before partial receipts count in full)
         pipeline = [
-            {"$match": {"status": "received"}},
+            {"$match": {"status": {"$in": ["partially_received", "received"]}}},
             {"$group": {
                 "_id": None,
-                "total_amount": {"$sum": "$total_amount"}
+                "total_amount": {"$sum": {"$ifNull": ["$received_amount", "$total_amount"]}}
             }}
         ]
         
@@ -415,6 +395,7 @@ async def get_po_statistics():
             "by_status": {
                 "pending": pending,
                 "approved": approved,
+                "partially_received": partially_received,
                 "received": received,
                 "cancelled": cancelled
             },
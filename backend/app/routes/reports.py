@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query
 from app.database import get_database
+from app.dates import date_range_query, parse_datetime
 from datetime import datetime, timedelta
 from typing import Optional
 from bson import ObjectId
+from app.services.time_buckets import PERIODS, TimeBuckets, to_date
 
 router = APIRouter()
 
@@ -40,21 +42,11 @@ async def get_sales_report(
     
     try:
         # Get all sales in date range
-        sales_cursor = db.sales.find({
-            "sale_date": {
-                "$gte": start.strftime("%Y-%m-%d"),
-                "$lte": end.strftime("%Y-%m-%d")
-            }
-        })
+        sales_cursor = db.sales.find(date_range_query("sale_date", start, end))
         sales = await sales_cursor.to_list(length=10000)
         
         # Get all bills in date range
-        bills_cursor = db.bills.find({
-            "created_at": {
-                "$gte": start.strftime("%Y-%m-%d"),
-                "$lte": end.strftime("%Y-%m-%d")
-            }
-        })
+        bills_cursor = db.bills.find(date_range_query("created_at", start, end))
         bills = await bills_cursor.to_list(length=10000)
         
         # Calculate total revenue from bills
@@ -66,13 +58,21 @@ async def get_sales_report(
         total_subtotal = sum(bill["subtotal"] for bill in bills)
         total_gst = sum(bill["gst_amount"] for bill in bills)
         
-        # Category-wise sales analysis
+        # Category-wise sales analysis (one bulk lookup of the distinct medicines sold)
+        medicine_ids = {sale["medicine_id"] for sale in sales}
+        medicines_cursor = db.medicines.find(
+            {"_id": {"$in": [ObjectId(med_id) for med_id in medicine_ids if ObjectId.is_valid(med_id)]}},
+            {"category": 1}
+        )
+        medicine_categories = {
+            str(med["_id"]): med.get("category", "Unknown")
+            async for med in medicines_cursor
+        }
+        
         category_sales = {}
         for sale in sales:
-            # Get medicine details to find category
-            medicine = await db.medicines.find_one({"_id": ObjectId(sale["medicine_id"])})
-            if medicine:
-                category = medicine.get("category", "Unknown")
+            category = medicine_categories.get(sale["medicine_id"])
+            if category is not None:
                 if category not in category_sales:
                     category_sales[category] = {
                         "category": category,
@@ -124,101 +124,18 @@ async def get_sales_report(
         
         payment_analysis = list(payment_mode_sales.values())
         
-        # Revenue trends based on period
+        # Revenue trends based on period (each sale and bill is bucketed once)
         trends = []
-        if period == "daily":
-            # Daily trends
-            current = start
-            while current <= end:
-                day_str = current.strftime("%Y-%m-%d")
-                day_sales = [s for s in sales if s["sale_date"] == day_str]
-                day_bills = [b for b in bills if b["created_at"].startswith(day_str)]
-                
-                trends.append({
-                    "date": day_str,
-                    "label": current.strftime("%b %d"),
-                    "sales_count": len(day_sales),
-                    "bills_count": len(day_bills),
-                    "revenue": sum(b["grand_total"] for b in day_bills),
-                    "quantity_sold": sum(s["quantity"] for s in day_sales)
-                })
-                current += timedelta(days=1)
-        
-        elif period == "weekly":
-            # Weekly trends
-            current = start
-            week_num = 1
-            while current <= end:
-                week_end = min(current + timedelta(days=6), end)
-                week_sales = [s for s in sales if 
-                            start <= datetime.strptime(s["sale_date"], "%Y-%m-%d") <= week_end]
-                week_bills = [b for b in bills if 
-                            start <= datetime.strptime(b["created_at"][:10], "%Y-%m-%d") <= week_end]
-                
-                trends.append({
-                    "date": current.strftime("%Y-%m-%d"),
-                    "label": f"Week {week_num}",
-                    "sales_count": len(week_sales),
-                    "bills_count": len(week_bills),
-                    "revenue": sum(b["grand_total"] for b in week_bills),
-                    "quantity_sold": sum(s["quantity"] for s in week_sales)
-                })
-                current = week_end + timedelta(days=1)
-                week_num += 1
-        
-        elif period == "monthly":
-            # Monthly trends
-            months = {}
-            for sale in sales:
-                sale_date = datetime.strptime(sale["sale_date"], "%Y-%m-%d")
-                month_key = sale_date.strftime("%Y-%m")
-                if month_key not in months:
-                    months[month_key] = {
-                        "date": month_key + "-01",
-                        "label": sale_date.strftime("%b %Y"),
-                        "sales_count": 0,
-                        "bills_count": 0,
-                        "revenue": 0,
-                        "quantity_sold": 0
-                    }
-                months[month_key]["sales_count"] += 1
-                months[month_key]["quantity_sold"] += sale["quantity"]
-            
-            for bill in bills:
-                bill_date = datetime.strptime(bill["created_at"][:10], "%Y-%m-%d")
-                month_key = bill_date.strftime("%Y-%m")
-                if month_key in months:
-                    months[month_key]["bills_count"] += 1
-                    months[month_key]["revenue"] += bill["grand_total"]
-            
-            trends = sorted(months.values(), key=lambda x: x["date"])
-        
-        elif period == "yearly":
-            # Yearly trends
-            years = {}
+        if period in PERIODS:
+            buckets = TimeBuckets(
+                start, end, period,
+                fields=["sales_count", "bills_count", "revenue", "quantity_sold"]
+            )
             for sale in sales:
-                sale_date = datetime.strptime(sale["sale_date"], "%Y-%m-%d")
-                year_key = sale_date.strftime("%Y")
-                if year_key not in years:
-                    years[year_key] = {
-                        "date": year_key + "-01-01",
-                        "label": year_key,
-                        "sales_count": 0,
-                        "bills_count": 0,
-                        "revenue": 0,
-                        "quantity_sold": 0
-                    }
-                years[year_key]["sales_count"] += 1
-                years[year_key]["quantity_sold"] += sale["quantity"]
-            
+                buckets.add(sale["sale_date"], sales_count=1, quantity_sold=sale["quantity"])
             for bill in bills:
-                bill_date = datetime.strptime(bill["created_at"][:10], "%Y-%m-%d")
-                year_key = bill_date.strftime("%Y")
-                if year_key in years:
-                    years[year_key]["bills_count"] += 1
-                    years[year_key]["revenue"] += bill["grand_total"]
-            
-            trends = sorted(years.values(), key=lambda x: x["date"])
+                buckets.add(bill["created_at"], bills_count=1, revenue=bill["grand_total"])
+            trends = buckets.to_list()
         
         # Calculate average values
         avg_bill_value = total_revenue / total_bills_count if total_bills_count > 0 else 0
@@ -269,6 +186,22 @@ async def get_inventory_report(
         # Current date for expiry calculations
         today = datetime.now()
         
+        # Sales data for every medicine (last 30 days) in one grouped aggregation
+        sales_match = date_range_query("sale_date", today - timedelta(days=30))
+        if category:
+            sales_match["medicine_id"] = {"$in": [str(med["_id"]) for med in medicines]}
+        
+        sales_pipeline = [
+            {"$match": sales_match},
+            {"$group": {
+                "_id": "$medicine_id",
+                "total_sold": {"$sum": "$quantity"},
+                "sales_count": {"$sum": 1}
+            }}
+        ]
+        sales_stats = await db.sales.aggregate(sales_pipeline).to_list(length=None)
+        sales_by_medicine = {stat["_id"]: stat for stat in sales_stats}
+        
         # Initialize metrics
         total_value = 0
         expired_items = []
@@ -289,9 +222,8 @@ async def get_inventory_report(
             total_value += item_value
             
             # Parse expiry date
-            expiry_str = med.get("expiry_date", "")
             try:
-                expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d")
+                expiry_date = parse_datetime(med.get("expiry_date"))
                 days_to_expiry = (expiry_date - today).days
                 
                 # Categorize by expiry
@@ -301,7 +233,7 @@ async def get_inventory_report(
                         "name": med["name"],
                         "batch_no": med.get("batch_no", "N/A"),
                         "quantity": quantity,
-                        "expiry_date": expiry_str,
+                        "expiry_date": expiry_date,
                         "days_expired": abs(days_to_expiry),
                         "value_loss": round(item_value, 2)
                     })
@@ -311,11 +243,11 @@ async def get_inventory_report(
                         "name": med["name"],
                         "batch_no": med.get("batch_no", "N/A"),
                         "quantity": quantity,
-                        "expiry_date": expiry_str,
+                        "expiry_date": expiry_date,
                         "days_to_expiry": days_to_expiry,
                         "value": round(item_value, 2)
                     })
-            except ValueError:
+            except (ValueError, TypeError):
                 pass
             
             # Stock level analysis
@@ -336,20 +268,10 @@ async def get_inventory_report(
                     "value": round(item_value, 2)
                 })
             
-            # Get sales data for this medicine (last 30 days)
-            thirty_days_ago = (today - timedelta(days=30)).strftime("%Y-%m-%d")
-            sales_count = await db.sales.count_documents({
-                "medicine_id": med_id,
-                "sale_date": {"$gte": thirty_days_ago}
-            })
-            
-            # Get total quantity sold
-            sales_cursor = db.sales.find({
-                "medicine_id": med_id,
-                "sale_date": {"$gte": thirty_days_ago}
-            })
-            sales = await sales_cursor.to_list(length=1000)
-            total_sold = sum(s.get("quantity", 0) for s in sales)
+            # Sales data for this medicine (last 30 days)
+            med_sales = sales_by_medicine.get(med_id, {})
+            sales_count = med_sales.get("sales_count", 0)
+            total_sold = med_sales.get("total_sold", 0)
             
             # Calculate turnover ratio (sales per month / current stock)
             turnover_ratio = (total_sold / quantity) if quantity > 0 else 0
@@ -400,10 +322,11 @@ async def get_inventory_report(
         )
         
         # Reorder suggestions (low stock + fast moving)
+        fast_moving_ids = {fm["medicine_id"] for fm in fast_moving}
         reorder_suggestions = []
         for item in low_stock_items[:20]:  # Top 20 low stock items
             # Check if it's also fast moving
-            is_fast_moving = any(fm["medicine_id"] == item["medicine_id"] for fm in fast_moving)
+            is_fast_moving = item["medicine_id"] in fast_moving_ids
             reorder_suggestions.append({
                 **item,
                 "priority": "High" if is_fast_moving else "Medium",
@@ -460,12 +383,7 @@ async def get_customer_report(
         customers = await customers_cursor.to_list(length=10000)
         
         # Get all bills in date range
-        bills_cursor = db.bills.find({
-            "created_at": {
-                "$gte": start.strftime("%Y-%m-%d"),
-                "$lte": end.strftime("%Y-%m-%d")
-            }
-        })
+        bills_cursor = db.bills.find(date_range_query("created_at", start, end))
         bills = await bills_cursor.to_list(length=10000)
         
         # Calculate customer purchase patterns
@@ -506,14 +424,12 @@ async def get_customer_report(
         returning_customers = []
         
         for customer in customers:
-            created_at = customer.get("created_at", "")
             try:
-                created_date = datetime.strptime(created_at[:10], "%Y-%m-%d")
-                if start <= created_date <= end:
+                if start.date() <= to_date(customer["created_at"]) <= end.date():
                     new_customers.append(customer)
                 else:
                     returning_customers.append(customer)
-            except (ValueError, TypeError):
+            except (KeyError, ValueError, TypeError):
                 returning_customers.append(customer)
         
         # Customer retention rate
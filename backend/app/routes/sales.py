@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from app.database import get_database
+from app.dates import date_range_query
+from app.exports import export_response, CURSOR_BATCH_SIZE
+from app.pagination import paginate, set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.models import Sale
-from bson import ObjectId
+from app.services.rollups import record_sale
+from app.services.forecasts import record_sale_stats
+from app.services.stock import checkout, MedicineNotFoundError, InsufficientStockError
+from typing import Optional
 
 router = APIRouter()
 
@@ -9,48 +15,74 @@ router = APIRouter()
 async def add_sale(sale: Sale):
     db = get_database()
     
-    # Check if medicine exists and has enough quantity
-    medicine = await db.medicines.find_one({"_id": ObjectId(sale.medicine_id)})
-    
-    if not medicine:
+    # Draw the stock (earliest-expiring lots first) and insert the sale, all or nothing
+    sale_dict = sale.dict()
+    try:
+        result = await checkout(db, [sale_dict], "sales", sale_dict)
+    except MedicineNotFoundError:
         raise HTTPException(status_code=404, detail="Medicine not found")
-    
-    if medicine["quantity"] < sale.quantity:
+    except InsufficientStockError as e:
         raise HTTPException(
             status_code=400, 
-            detail=f"Insufficient stock! Available: {medicine['quantity']}, Requested: {sale.quantity}"
+            detail=f"Insufficient stock! Available: {e.available}, Requested: {e.requested}"
         )
     
-    # Reduce stock
-    await db.medicines.update_one(
-        {"_id": ObjectId(sale.medicine_id)},
-        {"$inc": {"quantity": -sale.quantity}}
-    )
-    
-    result = await db.sales.insert_one(sale.dict())
+    # Derived data, kept outside the checkout: a failure here only leaves the rollups and
+    # forecast statistics short by this sale until their next rebuild
+    await record_sale(db, sale_dict)
+    await record_sale_stats(db, sale_dict)
     return {"id": str(result.inserted_id), "message": "Sale recorded successfully"}
 
 @router.get("/")
-async def get_sales():
+async def get_sales(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
+):
     db = get_database()
-    sales = await db.sales.find().sort("sale_date", -1).to_list(1000)
+    sales, next_cursor = await paginate(db.sales, {}, "sale_date", -1, limit, after)
+    set_next_cursor(response, next_cursor)
     for sale in sales:
         sale["_id"] = str(sale["_id"])
     return sales
 
+SALE_EXPORT_COLUMNS = ["_id", "medicine_id", "medicine_name", "quantity", "price", "total", "sale_date", "user_email"]
+
+@router.get("/export")
+async def export_sales(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    format: str = Query("ndjson", description="Export format: ndjson or csv")
+):
+    db = get_database()
+    cursor = db.sales.find(
+        date_range_query("sale_date", start_date, end_date),
+        {column: 1 for column in SALE_EXPORT_COLUMNS}
+    ).sort([("sale_date", 1), ("_id", 1)]).batch_size(CURSOR_BATCH_SIZE)
+    
+    async def rows():
+        async for sale in cursor:
+            sale["_id"] = str(sale["_id"])
+            yield sale
+    
+    return export_response(rows(), SALE_EXPORT_COLUMNS, format, "sales")
+
 @router.get("/summary")
 async def get_sales_summary():
     db = get_database()
+    # Served from the daily rollups (direct sales and billed items) rather than raw transactions
     pipeline = [
         {
             "$group": {
                 "_id": "$medicine_name",
                 "total_quantity": {"$sum": "$quantity"},
-                "total_revenue": {"$sum": "$total"},
-                "count": {"$sum": 1}
+                "total_revenue": {"$sum": "$revenue"},
+                # Direct sales only, as before bills were rolled up; bills are counted separately
+                "count": {"$sum": "$sale_count"},
+                "bill_count": {"$sum": "$bill_count"}
             }
         },
         {"$sort": {"total_revenue": -1}}
     ]
-    summary = await db.sales.aggregate(pipeline).to_list(100)
+    summary = await db.daily_rollups.aggregate(pipeline).to_list(100)
     return summary
\ No newline at end of file
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from app.database import get_database
+from app.dates import coerce_dates
+from app.services.supplier_cache import supplier_cache
+from app.pagination import paginate, set_next_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from datetime import datetime
 from bson import ObjectId
 from typing import Optional
@@ -9,8 +12,11 @@ router = APIRouter()
 
 @router.get("/")
 async def get_suppliers(
+    response: Response,
     search: Optional[str] = None,
-    active_only: bool = False
+    active_only: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page")
 ):
     """
     Get all suppliers with optional search and filters.
@@ -32,8 +38,8 @@ async def get_suppliers(
             query["active"] = True
         
         # Fetch suppliers
-        suppliers_cursor = db.suppliers.find(query).sort("name", 1)
-        suppliers = await suppliers_cursor.to_list(length=1000)
+        suppliers, next_cursor = await paginate(db.suppliers, query, "name", 1, limit, after)
+        set_next_cursor(response, next_cursor)
         
         # Convert ObjectId to string
         for supplier in suppliers:
@@ -41,6 +47,8 @@ async def get_suppliers(
         
         return suppliers
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching suppliers: {str(e)}")
 
@@ -74,8 +82,8 @@ async def create_supplier(supplier: dict):
     
     try:
         # Add metadata
-        supplier["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        supplier["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        supplier["created_at"] = datetime.now()
+        supplier["updated_at"] = datetime.now()
         supplier["active"] = supplier.get("active", True)
         supplier["rating"] = supplier.get("rating", 0)
         supplier["total_orders"] = 0
@@ -83,6 +91,7 @@ async def create_supplier(supplier: dict):
         
         # Insert supplier
         result = await db.suppliers.insert_one(supplier)
+        supplier_cache.invalidate(str(result.inserted_id))
         
         # Fetch created supplier
         created_supplier = await db.suppliers.find_one({"_id": result.inserted_id})
@@ -104,15 +113,17 @@ async def update_supplier(supplier_id: str, supplier: dict):
     try:
         # Remove _id from update data if present
         supplier.pop("_id", None)
+        coerce_dates(supplier, "suppliers")
         
         # Update timestamp
-        supplier["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        supplier["updated_at"] = datetime.now()
         
         # Update supplier
         result = await db.suppliers.update_one(
             {"_id": ObjectId(supplier_id)},
             {"$set": supplier}
         )
+        supplier_cache.invalidate(supplier_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Supplier not found")
@@ -123,6 +134,8 @@ async def update_supplier(supplier_id: str, supplier: dict):
         
         return updated_supplier
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating supplier: {str(e)}")
 
@@ -142,8 +155,9 @@ async def delete_supplier(supplier_id: str):
             # Soft delete - mark as inactive
             result = await db.suppliers.update_one(
                 {"_id": ObjectId(supplier_id)},
-                {"$set": {"active": False, "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}}
+                {"$set": {"active": False, "updated_at": datetime.now()}}
             )
+            supplier_cache.invalidate(supplier_id)
             
             if result.matched_count == 0:
                 raise HTTPException(status_code=404, detail="Supplier not found")
@@ -152,6 +166,7 @@ async def delete_supplier(supplier_id: str):
         else:
             # Hard delete if no purchase orders
             result = await db.suppliers.delete_one({"_id": ObjectId(supplier_id)})
+            supplier_cache.invalidate(supplier_id)
             
             if result.deleted_count == 0:
                 raise HTTPException(status_code=404, detail="Supplier not found")
@@ -1,3 +1,3 @@
-from . import ml_model
+from . import date_migration, forecast_runner, forecasts, lots, ml_model, notification_hub, passwords, receiving, rollups, sequences, stock, supplier_cache, time_buckets, tokens
 
-__all__ = ['ml_model']
\ No newline at end of file
+__all__ = ['date_migration', 'forecast_runner', 'forecasts', 'lots', 'ml_model', 'notification_hub', 'passwords', 'receiving', 'rollups', 'sequences', 'stock', 'supplier_cache', 'time_buckets', 'tokens']
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Rolling-origin backtesting for demand forecasts.
+
+For each cutoff date the model is fitted on the sales before the cutoff and its
+forecast for every medicine over the next `horizon_days` days (HORIZON_DAYS by
+default) is compared with what actually happened in them. As with
+`predict_demand`, the quantity being forecast is the mean quantity per sale, so
+the actual value is the mean quantity of that medicine's sales inside the
+horizon window. Each medicine is
+scored over all cutoffs with MAE, MAPE (cutoffs with a non-zero actual only)
+and bias (mean of predicted - actual).
+
+Medicines are split across worker processes, and every run reports its wall
+time and the peak memory of each worker. Every chunk runs in a freshly spawned
+process, so a worker's peak covers that chunk alone. Usage:
+
+    python -m app.services.backtest [--cutoffs 8] [--step 7] [--horizon 7] [--workers 4] [--model linear] [--csv sales.csv]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from app.services.ml_model import HORIZON_DAYS, predict_demand
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SALE_COLUMNS = ["medicine_name", "sale_date", "quantity"]
+
+
+def _linear_model(train: pd.DataFrame, horizon_days: int) -> dict:
+    return {p["medicine_name"]: p["predicted_demand"] for p in predict_demand(train, horizon_days)}
+
+
+# Model variants to compare; each maps a training DataFrame and the horizon to {medicine_name: forecast}
+MODELS = {
+    "linear": _linear_model,
+}
+
+
+def default_cutoffs(sales: pd.DataFrame, count: int, step_days: int, horizon_days: int = HORIZON_DAYS) -> list:
+    """`count` cutoffs, `step_days` apart, the last leaving a full horizon of actuals (none without sales)."""
+    if sales.empty:
+        return []
+    last_cutoff = sales["sale_date"].max().normalize() - pd.Timedelta(days=horizon_days - 1)
+    return [last_cutoff - pd.Timedelta(days=step_days * i) for i in reversed(range(count))]
+
+
+def _backtest_chunk(args) -> tuple:
+    sales, cutoffs, horizon_days, model_name = args
+    model = MODELS[model_name]
+    rows = []
+
+    for cutoff in cutoffs:
+        train = sales[sales["sale_date"] < cutoff]
+        if train.empty:
+            continue
+        window = sales[(sales["sale_date"] >= cutoff) & (sales["sale_date"] < cutoff + pd.Timedelta(days=horizon_days))]
+        actual = window.groupby("medicine_name")["quantity"].mean()
+        predicted = model(train, horizon_days)
+
+        for medicine, actual_value in actual.items():
+            if medicine in predicted:
+                rows.append((medicine, cutoff, predicted[medicine], actual_value))
+
+    results = pd.DataFrame(rows, columns=["medicine_name", "cutoff", "predicted", "actual"])
+    return results, _peak_memory_mb()
+
+
+def score(results: pd.DataFrame) -> pd.DataFrame:
+    """Per-medicine MAE, MAPE and bias over all cutoffs."""
+    results = results.assign(
+        error=results["predicted"] - results["actual"],
+        abs_error=(results["predicted"] - results["actual"]).abs()
+    )
+    results["ape"] = np.where(results["actual"] > 0, results["abs_error"] / results["actual"], np.nan)
+
+    return results.groupby("medicine_name").agg(
+        cutoffs=("cutoff", "count"),
+        mae=("abs_error", "mean"),
+        mape=("ape", "mean"),
+        bias=("error", "mean")
+    ).reset_index()
+
+
+def _peak_memory_mb():
+    """Peak resident memory of this process so far, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_backtest(sales: pd.DataFrame, cutoffs: list = None, horizon_days: int = HORIZON_DAYS,
+                 model_name: str = "linear", workers: int = None, cutoff_count: int = 8,
+                 step_days: int = 7) -> dict:
+    """Backtest `model_name` on `sales` (medicine_name, sale_date, quantity) and score it."""
+    started = time.perf_counter()
+    sales = sales[SALE_COLUMNS].assign(sale_date=pd.to_datetime(sales["sale_date"]))
+    if cutoffs is None:
+        cutoffs = default_cutoffs(sales, cutoff_count, step_days, horizon_days)
+    workers = workers or os.cpu_count() or 1
+
+    if sales.empty or not cutoffs:
+        # Nothing to score; don't start any workers
+        parts = [(pd.DataFrame(columns=["medicine_name", "cutoff", "predicted", "actual"]), None)]
+    else:
+        # Split medicines (not rows) across workers so each series stays in one process
+        codes, _ = pd.factorize(sales["medicine_name"])
+        chunks = [(sales[codes % workers == i], cutoffs, horizon_days, model_name) for i in range(workers)]
+        # A fresh spawned process per chunk: its peak memory is that chunk's alone
+        with multiprocessing.get_context("spawn").Pool(workers, maxtasksperchild=1) as pool:
+            parts = pool.map(_backtest_chunk, chunks)
+
+    results = pd.concat([part for part, _ in parts], ignore_index=True)
+    worker_peaks = [peak for _, peak in parts if peak is not None]
+    per_medicine = score(results)
+    error = results["predicted"] - results["actual"]
+    ape = error.abs() / results["actual"].where(results["actual"] > 0)
+
+    return {
+        "model": model_name,
+        "cutoffs": [cutoff.strftime("%Y-%m-%d") for cutoff in cutoffs],
+        "medicines": len(per_medicine),
+        "overall": {
+            "mae": float(error.abs().mean()) if len(results) else None,
+            "mape": float(ape.mean()) if len(results) else None,
+            "bias": float(error.mean()) if len(results) else None
+        },
+        "per_medicine": per_medicine,
+        "wall_time_s": round(time.perf_counter() - started, 2),
+        "peak_memory_mb": max(worker_peaks) if worker_peaks else None,
+        "worker_peak_memory_mb": worker_peaks
+    }
+
+
+def load_sales_from_db() -> pd.DataFrame:
+    """Stream the sales collection into column arrays (only the fields the model needs)."""
+    from pymongo import MongoClient
+    from app.database import MONGODB_URL, DATABASE_NAME
+
+    client = MongoClient(MONGODB_URL)
+    try:
+        columns = {column: [] for column in SALE_COLUMNS}
+        cursor = client[DATABASE_NAME].sales.find(
+            {}, {"_id": 0, **{column: 1 for column in SALE_COLUMNS}}, batch_size=10_000
+        )
+        for sale in cursor:
+            for column in SALE_COLUMNS:
+                columns[column].append(sale.get(column))
+        return pd.DataFrame(columns)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of demand forecasts")
+    parser.add_argument("--cutoffs", type=int, default=8, help="Number of cutoff dates")
+    parser.add_argument("--step", type=int, default=7, help="Days between cutoffs")
+    parser.add_argument("--horizon", type=int, default=HORIZON_DAYS, help="Days forecast after each cutoff")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--model", choices=sorted(MODELS), default="linear")
+    parser.add_argument("--csv", help="Read sales from a CSV file instead of MongoDB")
+    args = parser.parse_args()
+
+    sales = pd.read_csv(args.csv, usecols=SALE_COLUMNS) if args.csv else load_sales_from_db()
+    print(f"📦 Loaded {len(sales):,} sales")
+
+    report = run_backtest(sales, horizon_days=args.horizon, model_name=args.model, workers=args.workers,
+                          cutoff_count=args.cutoffs, step_days=args.step)
+
+    print(f"🔁 Model: {report['model']}, cutoffs: {', '.join(report['cutoffs'])}")
+    print(f"💊 Medicines scored: {report['medicines']:,}")
+    print(f"📏 MAE: {report['overall']['mae']}, MAPE: {report['overall']['mape']}, Bias: {report['overall']['bias']}")
+    print(f"⏱️  Wall time: {report['wall_time_s']}s, peak worker memory: {report['peak_memory_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Online migration of string timestamps to BSON dates.
+
+Every field in DATE_FIELDS is walked in `_id` order, one batch at a time, and
+each "YYYY-MM-DD" / "YYYY-MM-DD HH:MM:SS" string is replaced with a BSON date.
+Each update only applies if the field still holds the string that was read, so
+concurrent writes are never overwritten and the migration can be stopped and
+re-run at any point.
+
+It runs in the background at startup of every worker, but only the worker
+holding the lease in the `app_settings` document `date_migration` migrates;
+it renews the lease while it works and records `status: "done"` when a full
+pass has finished. The others poll that document, and take over if the lease
+expires. Every worker keeps matching the legacy string form until the
+database says the migration is done. It can also be run by hand with:
+
+    python -m app.services.date_migration
+"""
+
+import asyncio
+import secrets
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.dates import DATE_FIELDS, parse_datetime, set_legacy_strings
+
+BATCH_SIZE = 1000
+MIGRATION_ID = "date_migration"
+LEASE_SECONDS = 60
+# How often workers without the lease check whether the migration finished
+POLL_SECONDS = 15
+
+
+async def _migrate_field(db, collection: str, field: str, batch_size: int):
+    """Convert one field; returns (converted, unparseable)."""
+    converted = unparseable = 0
+    last_id = None
+
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await db[collection].find(query, {field: 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        updates = []
+        for doc in docs:
+            try:
+                value = parse_datetime(doc[field])
+            except ValueError:
+                unparseable += 1
+                continue
+            updates.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+
+        if updates:
+            result = await db[collection].bulk_write(updates, ordered=False)
+            converted += result.modified_count
+        # Let request handlers run between batches
+        await asyncio.sleep(0)
+
+    return converted, unparseable
+
+
+async def migrate_dates(db, batch_size: int = BATCH_SIZE) -> dict:
+    """Backfill every string timestamp; returns {"collection.field": converted} and the unparseable count."""
+    converted = {}
+    unparseable = 0
+    for collection, fields in DATE_FIELDS.items():
+        for field in fields:
+            count, bad = await _migrate_field(db, collection, field, batch_size)
+            unparseable += bad
+            if count:
+                converted[f"{collection}.{field}"] = count
+    return {"converted": converted, "unparseable": unparseable}
+
+
+async def _acquire_lease(db, owner: str) -> bool:
+    now = datetime.now()
+    try:
+        doc = await db.app_settings.find_one_and_update(
+            {
+                "_id": MIGRATION_ID,
+                "status": {"$ne": "done"},
+                "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}]
+            },
+            {"$set": {"status": "running", "owner": owner, "lease_until": now + timedelta(seconds=LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The document exists and is done or leased by another worker
+        return False
+    return doc is not None
+
+
+async def _renew_lease(db, owner: str):
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        await db.app_settings.update_one(
+            {"_id": MIGRATION_ID, "owner": owner},
+            {"$set": {"lease_until": datetime.now() + timedelta(seconds=LEASE_SECONDS)}}
+        )
+
+
+async def migrate_once(db, batch_size: int = BATCH_SIZE):
+    """
+    Run the migration if it isn't done and no other worker holds the lease.
+    Returns the migrate_dates result, or None if it didn't run.
+    """
+    owner = secrets.token_hex(8)
+    if not await _acquire_lease(db, owner):
+        return None
+
+    renew = asyncio.create_task(_renew_lease(db, owner))
+    try:
+        result = await migrate_dates(db, batch_size)
+    finally:
+        renew.cancel()
+    # Unparseable strings can't be compared as dates anyway, so they don't keep the fallback alive
+    await db.app_settings.update_one(
+        {"_id": MIGRATION_ID, "owner": owner},
+        {
+            "$set": {"status": "done", "finished_at": datetime.now(), "unparseable": result["unparseable"]},
+            "$unset": {"owner": "", "lease_until": ""}
+        }
+    )
+    return result
+
+
+async def migration_done(db) -> bool:
+    doc = await db.app_settings.find_one({"_id": MIGRATION_ID}, {"status": 1})
+    return doc is not None and doc.get("status") == "done"
+
+
+def _report(result: dict):
+    for name, count in result["converted"].items():
+        print(f"📅 Converted {count} {name} values to dates")
+    if result["unparseable"]:
+        print(f"⚠️  {result['unparseable']} timestamp strings could not be parsed and were left as-is")
+
+
+async def run_date_migration(db):
+    """Background startup task: migrate or wait for the worker that does, then drop the fallback."""
+    try:
+        while not await migration_done(db):
+            result = await migrate_once(db)
+            if result is not None:
+                _report(result)
+                break
+            await asyncio.sleep(POLL_SECONDS)
+        set_legacy_strings(False)
+    except Exception as e:
+        print(f"❌ Date migration failed: {e!r}")
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.database import MONGODB_URL, DATABASE_NAME
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        db = client[DATABASE_NAME]
+        if await migration_done(db):
+            print("✅ Date migration already finished")
+            return
+        result = await migrate_once(db)
+        if result is None:
+            print("⏳ Date migration is being run by the API; try again later")
+            return
+        _report(result)
+        print(f"✅ Date migration finished ({sum(result['converted'].values())} values converted)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
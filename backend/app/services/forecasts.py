@@ -0,0 +1,261 @@
+"""
+Online demand-forecast state.
+
+Each medicine keeps running least-squares sufficient statistics of quantity
+against sale day in the `forecast_stats` collection:
+
+    n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_day
+
+where x is the sale's day number (days since FORECAST_EPOCH) and y the quantity
+of one sale or bill line. The documents are updated with `$inc` whenever a
+sale or bill is recorded, so a forecast is O(1) per medicine, needs no scan of
+the sales history and covers every sale ever made. Every update also sets
+`stale: true` and bumps `version`, which marks the medicines whose forecast
+has to be recomputed; `refresh_stored_forecasts` refits only those and keeps
+the results in the `predictions` collection (one document per medicine, tagged
+`source: "forecast"`), where `stored_forecasts` serves them from. The
+statistics can be rebuilt from the raw `sales` and `bills` collections with:
+
+    python -m app.services.forecasts
+"""
+
+import asyncio
+from datetime import date, datetime
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+from app.dates import day_expr
+from app.indexes import INDEXES
+from app.services.ml_model import HORIZON_DAYS, fit_from_sums, forecast_from_fit
+from app.services.time_buckets import to_date
+
+FORECAST_EPOCH = date(2020, 1, 1)
+STAT_FIELDS = ["n", "sum_x", "sum_y", "sum_xy", "sum_xx", "sum_yy"]
+MIN_SALES = 7
+REBUILD_COLLECTION = "forecast_stats_rebuild"
+FORECAST_FIELDS = {"_id": 0, "medicine_name": 1, "predicted_demand": 1, "confidence": 1, "recommendation": 1}
+
+
+def day_number(value) -> int:
+    return (to_date(value) - FORECAST_EPOCH).days
+
+
+def _add_point(increments: dict, x: int, y: float, sign: int = 1):
+    increments["n"] += sign
+    increments["sum_x"] += sign * x
+    increments["sum_y"] += sign * y
+    increments["sum_xy"] += sign * x * y
+    increments["sum_xx"] += sign * x * x
+    increments["sum_yy"] += sign * y * y
+
+
+def _stats_updates(points: list, sign: int = 1) -> list:
+    """Combine (medicine_id, medicine_name, x, y) points into one upsert per medicine."""
+    per_medicine = {}
+    for medicine_id, medicine_name, x, y in points:
+        entry = per_medicine.setdefault(medicine_id, {
+            "medicine_name": medicine_name,
+            "last_day": x,
+            "increments": dict.fromkeys(STAT_FIELDS, 0)
+        })
+        entry["last_day"] = max(entry["last_day"], x)
+        _add_point(entry["increments"], x, y, sign)
+
+    updates = []
+    for medicine_id, entry in per_medicine.items():
+        update = {
+            "$inc": {**entry["increments"], "version": 1},
+            "$set": {"medicine_name": entry["medicine_name"], "stale": True}
+        }
+        if sign > 0:
+            update["$max"] = {"last_day": entry["last_day"]}
+        updates.append(UpdateOne({"medicine_id": medicine_id}, update, upsert=True))
+    return updates
+
+
+async def record_sale_stats(db, sale: dict):
+    """Add a direct sale to its medicine's forecast statistics."""
+    updates = _stats_updates([
+        (sale["medicine_id"], sale["medicine_name"], day_number(sale["sale_date"]), sale["quantity"])
+    ])
+    await db.forecast_stats.bulk_write(updates)
+
+
+async def record_bill_stats(db, bill: dict, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) every line of a bill from the forecast statistics."""
+    x = day_number(bill["created_at"])
+    updates = _stats_updates(
+        [(item["medicine_id"], item["medicine_name"], x, item["quantity"]) for item in bill["items"]],
+        sign
+    )
+    if updates:
+        await db.forecast_stats.bulk_write(updates, ordered=False)
+
+
+def forecasts_from_stats(stats: list, horizon_days: int = HORIZON_DAYS, include_ids: bool = False) -> list:
+    """Forecast every medicine in `stats` (forecast_stats documents) at once."""
+    if not stats:
+        return []
+
+    fit = fit_from_sums(
+        *([doc.get(field, 0) for doc in stats] for field in STAT_FIELDS),
+        last_day=[doc.get("last_day", 0) for doc in stats]
+    )
+    return forecast_from_fit(
+        [doc["medicine_name"] for doc in stats], fit, horizon_days=horizon_days,
+        medicine_ids=[doc["medicine_id"] for doc in stats] if include_ids else None
+    )
+
+
+async def forecast_medicines(db, medicine_ids: list, horizon_days: int = HORIZON_DAYS) -> list:
+    """Forecast only the given medicines (one indexed query on forecast_stats.medicine_id)."""
+    stats = await db.forecast_stats.find(
+        {"medicine_id": {"$in": list(medicine_ids)}, "n": {"$gt": 0}},
+        {"_id": 0}
+    ).to_list(length=None)
+    return forecasts_from_stats(stats, horizon_days=horizon_days, include_ids=True)
+
+
+async def refresh_stored_forecasts(db, compute=None) -> int:
+    """
+    Refit the medicines whose statistics are stale and store their forecasts.
+
+    `compute(stats)` turns forecast_stats documents into forecasts (default:
+    forecasts_from_stats in this process). A medicine's stale flag is only
+    cleared if its statistics didn't change while it was being refitted.
+    Returns the number of medicines refitted.
+    """
+    totals = await db.forecast_stats.aggregate(
+        [{"$group": {"_id": None, "n": {"$sum": "$n"}}}]
+    ).to_list(length=1)
+    if not totals or totals[0]["n"] < MIN_SALES:
+        await db.predictions.delete_many({"source": "forecast"})
+        return 0
+
+    stale = await db.forecast_stats.find({"stale": True}, {"_id": 0}).to_list(length=None)
+    if not stale:
+        return 0
+    fitted = [doc for doc in stale if doc.get("n", 0) > 0]
+    if compute is None:
+        forecasts = forecasts_from_stats(fitted, include_ids=True)
+    else:
+        forecasts = await compute(fitted)
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    by_medicine = {forecast["medicine_id"]: forecast for forecast in forecasts}
+    updates = []
+    for doc in stale:
+        stored = {"source": "forecast", "medicine_id": doc["medicine_id"]}
+        if doc["medicine_id"] in by_medicine:
+            updates.append(ReplaceOne(stored, {**by_medicine[doc["medicine_id"]], **stored, "date": today}, upsert=True))
+        else:
+            # Too few sales left to fit (e.g. after deleted bills)
+            updates.append(DeleteOne(stored))
+    await db.predictions.bulk_write(updates, ordered=False)
+
+    await db.forecast_stats.bulk_write([
+        UpdateOne({"medicine_id": doc["medicine_id"], "version": doc.get("version")}, {"$unset": {"stale": ""}})
+        for doc in stale
+    ], ordered=False)
+    return len(stale)
+
+
+async def forecasts_stale(db) -> bool:
+    """Whether any medicine's forecast needs refitting (one seek on the partial stale index)."""
+    return await db.forecast_stats.find_one({"stale": True}, {"_id": 1}) is not None
+
+
+async def stored_forecasts(db):
+    """Return the stored forecasts, highest demand first, or None if none have been computed."""
+    forecasts = await db.predictions.find(
+        {"source": "forecast"}, FORECAST_FIELDS
+    ).sort("predicted_demand", -1).to_list(length=None)
+    return forecasts or None
+
+
+def _day_expr(date_field: str) -> dict:
+    # Days between FORECAST_EPOCH and the day in date_field
+    return {"$dateDiff": {
+        "startDate": datetime(FORECAST_EPOCH.year, FORECAST_EPOCH.month, FORECAST_EPOCH.day),
+        "endDate": day_expr(date_field),
+        "unit": "day"
+    }}
+
+
+def _stats_pipeline(medicine_id: str, medicine_name: str, date_field: str, quantity: str) -> list:
+    return [
+        {"$project": {
+            "medicine_id": medicine_id,
+            "medicine_name": medicine_name,
+            "x": _day_expr(date_field),
+            "y": quantity
+        }},
+        {"$group": {
+            "_id": "$medicine_id",
+            "medicine_name": {"$last": "$medicine_name"},
+            "n": {"$sum": 1},
+            "sum_x": {"$sum": "$x"},
+            "sum_y": {"$sum": "$y"},
+            "sum_xy": {"$sum": {"$multiply": ["$x", "$y"]}},
+            "sum_xx": {"$sum": {"$multiply": ["$x", "$x"]}},
+            "sum_yy": {"$sum": {"$multiply": ["$y", "$y"]}},
+            "last_day": {"$max": "$x"}
+        }},
+        {"$project": {"_id": 0, "medicine_id": "$_id", "medicine_name": 1, "last_day": 1,
+                      **{field: 1 for field in STAT_FIELDS}, "stale": {"$literal": True}, "version": {"$literal": 1}}},
+        {"$merge": {
+            "into": REBUILD_COLLECTION,
+            "on": "medicine_id",
+            "whenMatched": [{"$set": {
+                **{field: {"$add": [f"${field}", f"$$new.{field}"]} for field in STAT_FIELDS},
+                "last_day": {"$max": ["$last_day", "$$new.last_day"]},
+                "medicine_name": "$$new.medicine_name",
+                "stale": True,
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+            }}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+async def rebuild_forecast_stats(db):
+    """
+    Recompute every medicine's statistics server-side from the raw sales and bills.
+
+    The statistics are built in a scratch collection that then replaces
+    `forecast_stats` in one rename, so readers never see a partial set. Every
+    medicine comes back stale and keeps its stored forecast until the next
+    refresh refits it. Sales recorded while the rebuild runs are only counted
+    if the pipelines read them, so run it when traffic is quiet.
+    """
+    await db[REBUILD_COLLECTION].drop()
+    # $merge needs the unique medicine_id index; rename keeps it
+    await db[REBUILD_COLLECTION].create_indexes(INDEXES["forecast_stats"])
+
+    await db.sales.aggregate(
+        _stats_pipeline("$medicine_id", "$medicine_name", "$sale_date", "$quantity")
+    ).to_list(length=None)
+    await db.bills.aggregate(
+        [{"$unwind": "$items"}] +
+        _stats_pipeline("$items.medicine_id", "$items.medicine_name", "$created_at", "$items.quantity")
+    ).to_list(length=None)
+
+    medicine_ids = await db[REBUILD_COLLECTION].distinct("medicine_id")
+    await db[REBUILD_COLLECTION].rename("forecast_stats", dropTarget=True)
+    # Medicines that no longer have any sales won't be refitted, so drop their forecasts now
+    await db.predictions.delete_many({"source": "forecast", "medicine_id": {"$nin": medicine_ids}})
+    return len(medicine_ids)
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.database import MONGODB_URL, DATABASE_NAME
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        count = await rebuild_forecast_stats(client[DATABASE_NAME])
+        print(f"✅ Rebuilt forecast statistics for {count} medicines")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,256 @@
+"""
+Lot-level stock with first-expiry-first-out (FEFO) allocation.
+
+Stock is held in the `lots` collection, one document per (medicine, batch,
+expiry date):
+
+    {"medicine_id": "...", "batch_no": "AMX2024001", "expiry_date": ..., "quantity": 120}
+
+`medicines.quantity` stays the total over a medicine's lots, and
+`medicines.batch_no` / `expiry_date` mirror its earliest-expiring open lot, so
+stock reports and expiry alerts keep reading the medicine document.
+
+`take` draws stock from a medicine's unexpired lots, earliest expiry first.
+Each step is one find_one_and_update that seeks to the head of the partial
+(medicine_id, expiry_date, _id) index over open lots and takes
+min(needed, lot quantity) with an update pipeline, so a step is an O(log lots)
+index seek and atomic per lot however many lots are open. Most lines are
+filled by the first lot.
+
+Medicines from before lot tracking are moved into one lot each by a background
+task at startup, and on demand (`backfill_medicines`) by every path that adds
+to or draws from their lots, so their stock stays sellable meanwhile.
+"""
+
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from app.dates import day_start, parse_datetime
+
+FEFO_SORT = [("expiry_date", ASCENDING), ("_id", ASCENDING)]
+# Expiry of lots backfilled from medicines without a valid expiry date
+UNKNOWN_EXPIRY = datetime(9999, 12, 31)
+LOT_PROJECTION = {"batch_no": 1, "expiry_date": 1, "quantity": 1}
+
+
+class LotShortfall(Exception):
+    def __init__(self, available: int, medicine_id: str = None):
+        self.available = available
+        self.medicine_id = medicine_id
+        super().__init__(f"Only {available} units in unexpired lots")
+
+
+def open_lots_query(medicine_id: str, unexpired_on: datetime = None) -> dict:
+    """Lots of the medicine that still hold stock (matches the partial FEFO index)."""
+    query = {"medicine_id": medicine_id, "quantity": {"$gt": 0}}
+    if unexpired_on is not None:
+        query["expiry_date"] = {"$gte": unexpired_on}
+    return query
+
+
+def lot_increment(medicine_id: str, batch_no: str, expiry_date: datetime, quantity: int, now: datetime = None) -> UpdateOne:
+    """Add `quantity` to the (medicine, batch, expiry) lot, creating it if needed."""
+    now = now or datetime.now()
+    return UpdateOne(
+        {"medicine_id": medicine_id, "batch_no": batch_no, "expiry_date": expiry_date},
+        {"$inc": {"quantity": quantity}, "$set": {"updated_at": now}, "$setOnInsert": {"created_at": now}},
+        upsert=True
+    )
+
+
+async def take(db, medicine_id: str, quantity: int, session=None) -> tuple:
+    """
+    Draw `quantity` from the medicine's unexpired lots, earliest expiry first.
+
+    Returns (allocations, head_emptied): one {"medicine_id", "lot_id", "batch_no",
+    "expiry_date", "quantity"} per lot drawn from, and whether the earliest lot
+    ran out. Raises LotShortfall if the lots hold less; outside a transaction
+    whatever was drawn is put back first.
+    """
+    today = day_start(datetime.now())
+    allocations = []
+    head_emptied = False
+    needed = quantity
+
+    while needed > 0:
+        lot = await db.lots.find_one_and_update(
+            open_lots_query(medicine_id, today),
+            [{"$set": {"quantity": {"$max": [0, {"$subtract": ["$quantity", needed]}]}}}],
+            projection=LOT_PROJECTION,
+            sort=FEFO_SORT,
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if lot is None:
+            if session is None:
+                await put_back(db, allocations)
+            raise LotShortfall(quantity - needed)
+
+        amount = min(needed, lot["quantity"])
+        head_emptied = head_emptied or amount == lot["quantity"]
+        allocations.append({
+            "medicine_id": medicine_id,
+            "lot_id": str(lot["_id"]),
+            "batch_no": lot.get("batch_no"),
+            "expiry_date": lot.get("expiry_date"),
+            "quantity": amount
+        })
+        needed -= amount
+
+    return allocations, head_emptied
+
+
+async def take_in_transaction(db, quantities: dict, session) -> dict:
+    """
+    Draw {medicine_id: quantity} from unexpired lots, earliest expiry first,
+    inside the transaction of `session`: one find over the open lots of every
+    medicine and one bulk_write of the draws, however many lines there are.
+    The transaction's snapshot keeps the lots from changing in between (a
+    concurrent draw is a write conflict, and the transaction is retried).
+
+    Returns {medicine_id: (allocations, head_emptied)} like `take`; raises
+    LotShortfall (with its medicine_id) if a medicine's lots hold too little.
+    """
+    today = day_start(datetime.now())
+    open_lots = {}
+    cursor = db.lots.find(
+        {"medicine_id": {"$in": list(quantities)}, "quantity": {"$gt": 0}, "expiry_date": {"$gte": today}},
+        {**LOT_PROJECTION, "medicine_id": 1},
+        sort=[("medicine_id", ASCENDING)] + FEFO_SORT,
+        session=session
+    )
+    async for lot in cursor:
+        open_lots.setdefault(lot["medicine_id"], []).append(lot)
+
+    results = {}
+    updates = []
+    for medicine_id, quantity in quantities.items():
+        allocations = []
+        head_emptied = False
+        needed = quantity
+        for lot in open_lots.get(medicine_id, []):
+            if needed == 0:
+                break
+            amount = min(needed, lot["quantity"])
+            head_emptied = head_emptied or amount == lot["quantity"]
+            allocations.append({
+                "medicine_id": medicine_id,
+                "lot_id": str(lot["_id"]),
+                "batch_no": lot.get("batch_no"),
+                "expiry_date": lot.get("expiry_date"),
+                "quantity": amount
+            })
+            updates.append(UpdateOne({"_id": lot["_id"]}, {"$inc": {"quantity": -amount}}))
+            needed -= amount
+        if needed > 0:
+            raise LotShortfall(quantity - needed, medicine_id)
+        results[medicine_id] = (allocations, head_emptied)
+
+    if updates:
+        await db.lots.bulk_write(updates, ordered=False, session=session)
+    return results
+
+
+async def put_back(db, allocations: list, session=None):
+    """Return allocated quantities to the lots they were drawn from, in one bulk_write."""
+    updates = [
+        UpdateOne({"_id": ObjectId(allocation["lot_id"])}, {"$inc": {"quantity": allocation["quantity"]}})
+        for allocation in allocations
+    ]
+    if updates:
+        await db.lots.bulk_write(updates, ordered=False, session=session)
+
+
+async def refresh_heads(db, medicine_ids):
+    """Point each medicine's batch_no / expiry_date at its earliest-expiring open lot (expired or not)."""
+    async def refresh(medicine_id):
+        lot = await db.lots.find_one(open_lots_query(medicine_id), LOT_PROJECTION, sort=FEFO_SORT)
+        if lot:
+            head = {"batch_no": lot.get("batch_no")}
+            # A lot of unknown expiry leaves the medicine's own (missing or invalid) value alone
+            if lot.get("expiry_date") != UNKNOWN_EXPIRY:
+                head["expiry_date"] = lot.get("expiry_date")
+            await db.medicines.update_one({"_id": ObjectId(medicine_id)}, {"$set": head})
+
+    await asyncio.gather(*(refresh(medicine_id) for medicine_id in set(medicine_ids)))
+
+
+def lot_expiry(value) -> datetime:
+    """The lot expiry for a medicine's stored expiry_date: UNKNOWN_EXPIRY if it is missing or invalid."""
+    try:
+        return parse_datetime(value) or UNKNOWN_EXPIRY
+    except (TypeError, ValueError):
+        return UNKNOWN_EXPIRY
+
+
+async def _backfill_medicine(db, medicine_id: ObjectId):
+    """
+    Move an untracked medicine's stock into one lot and return the medicine,
+    or None if it was already tracked. Flipping `lots_tracked` is atomic, so
+    exactly one caller backfills each medicine, and the quantity it moves is
+    the one read by the flip: later receipts and restores add to the lots on
+    top of it, so no stock is lost or counted twice.
+    """
+    med = await db.medicines.find_one_and_update(
+        {"_id": medicine_id, "lots_tracked": {"$ne": True}},
+        {"$set": {"lots_tracked": True}},
+        projection={"name": 1, "batch_no": 1, "expiry_date": 1, "quantity": 1}
+    )
+    if med is not None and med.get("quantity", 0) > 0:
+        await db.lots.bulk_write([
+            lot_increment(str(medicine_id), med.get("batch_no", ""), lot_expiry(med.get("expiry_date")), med["quantity"])
+        ])
+    return med
+
+
+async def backfill_medicines(db, medicine_ids) -> list:
+    """
+    Backfill those of `medicine_ids` that are not tracked yet (one indexed query
+    when all are). Call before anything adds to or draws from their lots.
+    Returns the ids backfilled by this call.
+    """
+    ids = [ObjectId(medicine_id) for medicine_id in set(medicine_ids) if ObjectId.is_valid(medicine_id)]
+    untracked = await db.medicines.find(
+        {"_id": {"$in": ids}, "lots_tracked": {"$ne": True}}, {"_id": 1}
+    ).to_list(length=None)
+    backfilled = []
+    for med in untracked:
+        if await _backfill_medicine(db, med["_id"]):
+            backfilled.append(str(med["_id"]))
+    return backfilled
+
+
+async def backfill_lots(db) -> dict:
+    """
+    Give every medicine from before lot tracking one lot holding its current stock.
+
+    Stock of a medicine without a valid expiry date goes into a lot expiring
+    UNKNOWN_EXPIRY, so it stays sellable (drawn after every dated lot) and
+    doesn't show up as expiring. Returns {"backfilled": count, "unknown_expiry": [names]}.
+    """
+    count = 0
+    unknown_expiry = []
+    async for med in db.medicines.find({"lots_tracked": {"$ne": True}}, {"_id": 1}):
+        med = await _backfill_medicine(db, med["_id"])
+        if med is None:
+            continue  # backfilled on demand meanwhile
+        count += 1
+        if lot_expiry(med.get("expiry_date")) == UNKNOWN_EXPIRY:
+            unknown_expiry.append(med.get("name", str(med["_id"])))
+    return {"backfilled": count, "unknown_expiry": unknown_expiry}
+
+
+async def run_lot_backfill(db):
+    """Background startup task; checkouts, receipts and edits backfill the medicines they touch first."""
+    try:
+        result = await backfill_lots(db)
+        if result["backfilled"]:
+            print(f"📦 Created lots for {result['backfilled']} medicines")
+        if result["unknown_expiry"]:
+            print(
+                f"⚠️  {len(result['unknown_expiry'])} medicines have no valid expiry date; their stock is "
+                f"sold last until they are edited with one: {', '.join(result['unknown_expiry'])}"
+            )
+    except Exception as e:
+        print(f"❌ Lot backfill failed: {e!r}")
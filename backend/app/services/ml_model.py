@@ -1,40 +1,103 @@
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from datetime import datetime, timedelta
 import numpy as np
 
-def predict_demand(sales_data):
-    df = pd.DataFrame(sales_data)
-    df['sale_date'] = pd.to_datetime(df['sale_date'])
-    
+NS_PER_DAY = 86_400_000_000_000
+HORIZON_DAYS = 7
+
+
+def fit_trends(codes: np.ndarray, days: np.ndarray, quantities: np.ndarray, n_groups: int) -> dict:
+    """
+    Closed-form least-squares fit of quantity ~ day for every group at once.
+
+    `codes` assigns each row to a group in [0, n_groups). Returns per-group
+    arrays of n, slope, intercept, r2 and last_day, all computed with segment
+    reductions (np.bincount) instead of one model per group.
+    """
+    n = np.bincount(codes, minlength=n_groups).astype(float)
+    safe_n = np.maximum(n, 1)
+    mean_x = np.bincount(codes, weights=days, minlength=n_groups) / safe_n
+    mean_y = np.bincount(codes, weights=quantities, minlength=n_groups) / safe_n
+
+    # Centered sums of squares for numerical stability
+    dx = days - mean_x[codes]
+    dy = quantities - mean_y[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+    syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        ss_res = np.maximum(syy - slope * sxy, 0.0)
+        r2 = np.where(syy > 0, 1 - ss_res / syy, 1.0)
+    intercept = mean_y - slope * mean_x
+
+    last_day = np.zeros(n_groups)
+    np.maximum.at(last_day, codes, days)
+
+    return {"n": n, "slope": slope, "intercept": intercept, "r2": r2, "last_day": last_day}
+
+
+def fit_from_sums(n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, last_day) -> dict:
+    """
+    Same fit as `fit_trends`, but from running sufficient statistics per group
+    (n, Σx, Σy, Σxy, Σx², Σy²) instead of the raw rows.
+    """
+    n = np.asarray(n, dtype=float)
+    sum_xx = np.asarray(sum_xx, dtype=float)
+    sum_yy = np.asarray(sum_yy, dtype=float)
+    safe_n = np.maximum(n, 1)
+    mean_x = np.asarray(sum_x, dtype=float) / safe_n
+    mean_y = np.asarray(sum_y, dtype=float) / safe_n
+    sxx = np.maximum(sum_xx - n * mean_x * mean_x, 0.0)
+    sxy = np.asarray(sum_xy, dtype=float) - n * mean_x * mean_y
+    syy = np.maximum(sum_yy - n * mean_y * mean_y, 0.0)
+
+    # Anything within rounding error of the raw sums counts as zero variance
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 1e-12 * sum_xx, sxy / sxx, 0.0)
+        ss_res = np.maximum(syy - slope * sxy, 0.0)
+        r2 = np.where(syy > 1e-12 * sum_yy, 1 - ss_res / syy, 1.0)
+    intercept = mean_y - slope * mean_x
+
+    return {"n": n, "slope": slope, "intercept": intercept, "r2": r2, "last_day": np.asarray(last_day, dtype=float)}
+
+
+def forecast_from_fit(medicine_names, fit: dict, min_points: int = 3, horizon_days: int = HORIZON_DAYS,
+                      medicine_ids=None) -> list:
+    """Turn per-group fits into the prediction records returned by the API."""
+    # Mean of the fitted line over the next `horizon_days` days is its value at the midpoint
+    midpoint = fit["last_day"] + (horizon_days + 1) / 2
+    avg_prediction = np.maximum(0, fit["intercept"] + fit["slope"] * midpoint)
+    confidence = np.minimum(0.95, fit["r2"])
+
     predictions = []
-    
-    for medicine in df['medicine_name'].unique():
-        med_sales = df[df['medicine_name'] == medicine].sort_values('sale_date')
-        
-        if len(med_sales) < 3:
-            continue
-        
-        med_sales['days'] = (med_sales['sale_date'] - med_sales['sale_date'].min()).dt.days
-        
-        X = med_sales['days'].values.reshape(-1, 1)
-        y = med_sales['quantity'].values
-        
-        model = LinearRegression()
-        model.fit(X, y)
-        
-        last_day = med_sales['days'].max()
-        next_7_days = np.array([last_day + i for i in range(1, 8)]).reshape(-1, 1)
-        pred = model.predict(next_7_days)
-        
-        avg_prediction = max(0, pred.mean())
-        confidence = min(0.95, model.score(X, y))
-        
-        predictions.append({
-            "medicine_name": medicine,
-            "predicted_demand": round(avg_prediction, 2),
-            "confidence": round(confidence, 2),
-            "recommendation": "reorder" if avg_prediction > 10 else "sufficient"
-        })
-    
-    return sorted(predictions, key=lambda x: x['predicted_demand'], reverse=True)
\ No newline at end of file
+    for i in np.flatnonzero(fit["n"] >= min_points):
+        prediction = {
+            "medicine_name": medicine_names[i],
+            "predicted_demand": round(float(avg_prediction[i]), 2),
+            "confidence": round(float(confidence[i]), 2),
+            "recommendation": "reorder" if avg_prediction[i] > 10 else "sufficient"
+        }
+        if medicine_ids is not None:
+            prediction = {"medicine_id": medicine_ids[i], **prediction}
+        predictions.append(prediction)
+
+    return sorted(predictions, key=lambda x: x['predicted_demand'], reverse=True)
+
+
+def predict_demand(sales_data, horizon_days: int = HORIZON_DAYS):
+    df = pd.DataFrame(sales_data)
+
+    # Group once: one integer code per medicine, in order of first appearance
+    codes, medicine_names = pd.factorize(df['medicine_name'], sort=False)
+    valid = codes >= 0
+    codes = codes[valid]
+
+    # Whole days since each medicine's first sale (sale_date may carry a time of day)
+    sale_ns = pd.to_datetime(df['sale_date']).dt.normalize().values[valid].astype("datetime64[ns]").astype(np.int64)
+    first_ns = pd.Series(sale_ns).groupby(codes).min().reindex(range(len(medicine_names))).values
+    days = ((sale_ns - first_ns[codes]) // NS_PER_DAY).astype(float)
+    quantities = df['quantity'].values[valid].astype(float)
+
+    fit = fit_trends(codes, days, quantities, len(medicine_names))
+    return forecast_from_fit(list(medicine_names), fit, horizon_days=horizon_days)
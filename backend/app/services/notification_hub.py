@@ -0,0 +1,116 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+# Capped collection that carries events between uvicorn workers
+EVENTS_COLLECTION = "notification_events"
+EVENTS_SIZE = 1024 * 1024  # bytes; only recent events need to survive
+# Seconds to wait before reopening a dead tailable cursor
+TAIL_RETRY_DELAY = 1
+# How far behind the highest seq seen a reopened cursor starts (see _listen)
+RESUME_OVERLAP = 256
+
+
+class NotificationHub:
+    """
+    Fan-out of notification events to streaming clients across all workers.
+
+    Each connected client owns a bounded queue and simply awaits it, so idle
+    connections cost no database work. Publishers append an event to the
+    capped `notification_events` collection; every worker tails it with one
+    tailable cursor and copies each event to its own subscribers, so a client
+    hears about alerts created by any worker. Events carry a `seq` number from
+    the `counters` collection, which the listener resumes from when its cursor
+    dies. A client that falls behind loses its oldest queued events rather
+    than blocking the listener.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._events = None
+        self._listener = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    async def start(self, db) -> None:
+        """Create the events collection if needed and start tailing it."""
+        try:
+            await db.create_collection(EVENTS_COLLECTION, capped=True, size=EVENTS_SIZE)
+        except CollectionInvalid:
+            pass  # another worker created it
+        self._events = db[EVENTS_COLLECTION]
+        latest = await self._events.find_one({}, {"seq": 1}, sort=[("$natural", -1)])
+        self._listener = asyncio.create_task(self._listen(latest.get("seq", 0) if latest else 0))
+
+    def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    async def publish(self, event: str, data: dict) -> None:
+        await self.publish_many(event, [data])
+
+    async def publish_many(self, event: str, items: list) -> None:
+        if not items:
+            return
+        counter = await self._events.database.counters.find_one_and_update(
+            {"_id": EVENTS_COLLECTION},
+            {"$inc": {"value": len(items)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first = counter["value"] - len(items) + 1
+        now = datetime.now()
+        await self._events.insert_many([
+            {"seq": first + i, "message": format_sse(event, data), "created_at": now}
+            for i, data in enumerate(items)
+        ])
+
+    def _fan_out(self, message: str) -> None:
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def _listen(self, last_seq: int) -> None:
+        after = last_seq
+        seen = deque(maxlen=RESUME_OVERLAP)
+        while True:
+            cursor = self._events.find({"seq": {"$gt": after}}, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                # An idle getMore ends the async for but leaves the cursor open; it dies when
+                # the collection is empty or wraps past it
+                while cursor.alive:
+                    async for doc in cursor:
+                        if doc["seq"] in seen:
+                            continue
+                        seen.append(doc["seq"])
+                        last_seq = max(last_seq, doc["seq"])
+                        self._fan_out(doc["message"])
+            except PyMongoError as e:
+                print(f"⚠️  Notification stream interrupted: {e}")
+            # Concurrent publishers can insert slightly out of seq order, so reopen a little
+            # before the highest seq seen and skip the events already delivered
+            after = max(0, last_seq - RESUME_OVERLAP)
+            await asyncio.sleep(TAIL_RETRY_DELAY)
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+hub = NotificationHub()
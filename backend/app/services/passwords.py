@@ -0,0 +1,99 @@
+"""
+Password hashing.
+
+Passwords are hashed with salted scrypt (memory-hard) and stored as
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+
+with base64 salt and hash. Hashing and verification run in a bounded thread
+pool (hashlib.scrypt releases the GIL), so a burst of logins cannot stall the
+event loop for other requests. The cost and pool size are configurable with
+PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P and
+PASSWORD_HASH_WORKERS. The pool and the dummy hash used for unknown emails
+are created on first use, so importing this module costs nothing.
+
+Unsalted SHA-256 hex digests from earlier versions still verify; `needs_rehash`
+tells the login route to replace them (or hashes with outdated parameters).
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+@lru_cache(maxsize=None)
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+@lru_cache(maxsize=None)
+def _dummy_hash() -> str:
+    return hash_password_sync(base64.b64encode(os.urandom(12)).decode())
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt needs 128 * n * r bytes; leave headroom above OpenSSL's 32 MB default
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r, dklen=KEY_BYTES
+    )
+
+
+def _is_legacy(stored: str) -> bool:
+    return not stored.startswith("scrypt$")
+
+
+def hash_password_sync(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return "$".join([
+        "scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+        base64.b64encode(salt).decode(), base64.b64encode(key).decode()
+    ])
+
+
+def verify_password_sync(password: str, stored: str) -> bool:
+    if stored is None:
+        # Unknown email: verify against a dummy hash so both failures take equally long
+        verify_password_sync(password, _dummy_hash())
+        return False
+    if _is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        expected = base64.b64decode(key)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy SHA-256 hashes and scrypt hashes made with other parameters."""
+    if _is_legacy(stored):
+        return True
+    return stored.split("$")[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), hash_password_sync, password)
+
+
+async def verify_password(password: str, stored: str) -> bool:
+    """Check `password` against `stored`; pass stored=None for an unknown user."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), verify_password_sync, password, stored)
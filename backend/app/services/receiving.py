@@ -0,0 +1,241 @@
+"""
+Goods receipts for purchase orders.
+
+`receive` books a (possibly partial) delivery against an approved purchase
+order. Every PO line tracks `quantity_received` and `quantity_remaining`, and
+the order stays `partially_received` until nothing is outstanding.
+
+Each received (medicine, batch, expiry date) is added to its lot (see
+app.services.lots) and the medicine totals are raised, with one bulk_write of
+`$inc` updates each, so concurrent sales are never overwritten. The PO update
+is conditional on its `receipt_count`, so two receipts racing for the same
+order cannot both apply. On a replica set the PO update, the stock increments
+and the supplier totals run in one transaction, retried on write conflicts.
+On a standalone server the PO update goes first (it claims the receipt); if
+any later write fails, every increment known to have gone through is taken
+back out and the receipt is reverted.
+"""
+
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.dates import parse_datetime
+from app.services.lots import backfill_medicines, lot_increment, refresh_heads
+from app.services.stock import MedicineNotFoundError, bulk_write_or_undo, run_in_transaction, supports_transactions
+
+RECEIVABLE_STATUSES = ["approved", "partially_received"]
+
+
+class ReceiptError(Exception):
+    """The delivery doesn't fit the purchase order (unknown medicine, too many units)."""
+
+
+class ReceiptConflictError(Exception):
+    """The purchase order changed while the receipt was being booked."""
+
+
+def _line_state(item: dict) -> tuple:
+    received = item.get("quantity_received", 0)
+    return received, item.get("quantity", 0) - received
+
+
+def allocate_receipt(po_items: list, received_items: list) -> tuple:
+    """
+    Spread the received quantities over the PO lines of the same medicine, in order.
+
+    Returns (items, stock) where `items` are the PO lines with updated received
+    and remaining quantities and `stock` is
+    {medicine_id: {"medicine_name", "quantity", "lots": {(batch_no, expiry_date): quantity}}}.
+    """
+    items = [dict(item) for item in po_items]
+    for item in items:
+        item["quantity_received"], item["quantity_remaining"] = _line_state(item)
+
+    stock = {}
+    for received in received_items:
+        med_id = received.get("medicine_id")
+        try:
+            quantity = int(received.get("quantity_received", 0) or 0)
+        except (TypeError, ValueError):
+            raise ReceiptError(f"Invalid received quantity for medicine {med_id}: {received.get('quantity_received')}")
+        if quantity < 0:
+            raise ReceiptError(f"Received quantity cannot be negative for medicine {med_id}")
+        if quantity == 0:
+            continue
+
+        lines = [item for item in items if item.get("medicine_id") == med_id]
+        if not lines:
+            raise ReceiptError(f"Medicine {med_id} is not on this purchase order")
+        medicine_name = lines[0].get("medicine_name", med_id)
+
+        # batch_number is what older clients send
+        batch_no = received.get("batch_no") or received.get("batch_number")
+        try:
+            expiry_date = parse_datetime(received.get("expiry_date"))
+        except ValueError:
+            raise ReceiptError(f"Invalid expiry date for {medicine_name}: {received.get('expiry_date')}")
+        if not batch_no or not expiry_date:
+            raise ReceiptError(f"Batch number and expiry date are required for {medicine_name}")
+
+        remaining = sum(line["quantity_remaining"] for line in lines)
+        if quantity > remaining:
+            raise ReceiptError(
+                f"Too many units of {medicine_name}! "
+                f"Outstanding: {remaining}, Received: {quantity}"
+            )
+
+        left = quantity
+        for line in lines:
+            taken = min(left, line["quantity_remaining"])
+            line["quantity_received"] += taken
+            line["quantity_remaining"] -= taken
+            left -= taken
+
+        entry = stock.setdefault(med_id, {"medicine_name": medicine_name, "quantity": 0, "lots": {}})
+        entry["quantity"] += quantity
+        entry["lots"][(batch_no, expiry_date)] = entry["lots"].get((batch_no, expiry_date), 0) + quantity
+
+    if not stock:
+        raise ReceiptError("No received quantities given")
+    return items, stock
+
+
+def _stock_updates(stock: dict, now: datetime) -> tuple:
+    """(lot updates, their undo, medicine total updates, their undo), index-aligned."""
+    lot_updates, lot_undo, total_updates, total_undo = [], [], [], []
+    for med_id, entry in stock.items():
+        for (batch_no, expiry_date), quantity in entry["lots"].items():
+            lot_updates.append(lot_increment(med_id, batch_no, expiry_date, quantity, now))
+            lot_undo.append(UpdateOne(
+                {"medicine_id": med_id, "batch_no": batch_no, "expiry_date": expiry_date},
+                {"$inc": {"quantity": -quantity}}
+            ))
+        total_updates.append(UpdateOne(
+            {"_id": ObjectId(med_id)},
+            {"$inc": {"quantity": entry["quantity"]}, "$set": {"updated_at": now}}
+        ))
+        total_undo.append(UpdateOne({"_id": ObjectId(med_id)}, {"$inc": {"quantity": -entry["quantity"]}}))
+    return lot_updates, lot_undo, total_updates, total_undo
+
+
+async def _check_medicines(db, stock: dict):
+    for med_id, entry in stock.items():
+        if not ObjectId.is_valid(med_id):
+            raise MedicineNotFoundError(entry["medicine_name"])
+    ids = [ObjectId(med_id) for med_id in stock]
+    found = {str(med["_id"]) async for med in db.medicines.find({"_id": {"$in": ids}}, {"_id": 1})}
+    for med_id, entry in stock.items():
+        if med_id not in found:
+            raise MedicineNotFoundError(entry["medicine_name"])
+
+
+def _receipt_count_filter(po: dict):
+    count = po.get("receipt_count", 0)
+    # POs created before receipts were counted have no receipt_count field
+    return {"$in": [None, 0]} if count == 0 else count
+
+
+async def receive(db, po: dict, received_items: list, received_by: str = "Admin",
+                  notes: str = "", payment_status: str = "pending") -> dict:
+    """
+    Book a delivery against `po` (the current PO document) and return the new PO status.
+
+    Raises ReceiptError if the delivery doesn't fit the order, MedicineNotFoundError
+    if a medicine no longer exists and ReceiptConflictError if the PO changed meanwhile.
+    """
+    items, stock = allocate_receipt(po.get("items", []), received_items)
+    await _check_medicines(db, stock)
+    # Existing stock of medicines from before lot tracking gets its lot before units are added
+    await backfill_medicines(db, stock)
+
+    now = datetime.now()
+    prices = {item.get("medicine_id"): item.get("unit_price", 0) for item in items}
+    amount = sum(entry["quantity"] * prices.get(med_id, 0) for med_id, entry in stock.items())
+    receipt = {
+        "received_at": now,
+        "received_by": received_by,
+        "items": [
+            {"medicine_id": med_id, "quantity_received": quantity, "batch_no": batch_no, "expiry_date": expiry_date}
+            for med_id, entry in stock.items()
+            for (batch_no, expiry_date), quantity in entry["lots"].items()
+        ],
+        "amount": amount,
+        "notes": notes
+    }
+    status = "received" if all(item["quantity_remaining"] == 0 for item in items) else "partially_received"
+
+    po_filter = {
+        "_id": po["_id"],
+        "status": {"$in": RECEIVABLE_STATUSES},
+        "receipt_count": _receipt_count_filter(po)
+    }
+    po_update = {
+        "$set": {
+            "items": items,
+            "status": status,
+            "received_by": received_by,
+            "received_at": now,
+            "updated_at": now,
+            "items_received": receipt["items"],
+            "receive_notes": notes,
+            "payment_status": payment_status
+        },
+        "$inc": {"receipt_count": 1, "received_amount": amount},
+        "$push": {"receipts": receipt}
+    }
+    supplier_update = (
+        {"_id": ObjectId(po["supplier_id"])},
+        {"$inc": {"total_amount": amount}, "$set": {"updated_at": now}}
+    )
+    lot_updates, lot_undo, total_updates, total_undo = _stock_updates(stock, now)
+
+    if supports_transactions(db):
+        async def book(session):
+            result = await db.purchase_orders.update_one(po_filter, po_update, session=session)
+            if result.matched_count == 0:
+                raise ReceiptConflictError("Purchase order was changed by another request; reload and retry")
+            await db.lots.bulk_write(lot_updates, ordered=False, session=session)
+            await db.medicines.bulk_write(total_updates, ordered=False, session=session)
+            await db.suppliers.update_one(*supplier_update, session=session)
+
+        await run_in_transaction(db, book)
+        await refresh_heads(db, stock)
+        return status
+
+    result = await db.purchase_orders.update_one(po_filter, po_update)
+    if result.matched_count == 0:
+        raise ReceiptConflictError("Purchase order was changed by another request; reload and retry")
+    lots_applied = totals_applied = False
+    try:
+        await bulk_write_or_undo(db.lots, lot_updates, lot_undo)
+        lots_applied = True
+        await bulk_write_or_undo(db.medicines, total_updates, total_undo)
+        totals_applied = True
+        await db.suppliers.update_one(*supplier_update)
+    except Exception:
+        # Take back every increment known to have gone through, then release the receipt
+        if totals_applied:
+            await db.medicines.bulk_write(total_undo, ordered=False)
+        if lots_applied:
+            await db.lots.bulk_write(lot_undo, ordered=False)
+        await _revert_receipt(db, po, po_update, receipt, now)
+        raise
+    await refresh_heads(db, stock)
+    return status
+
+
+async def _revert_receipt(db, po: dict, po_update: dict, receipt: dict, now: datetime):
+    """Undo `po_update`: every field it set goes back to its value in `po` (or is removed)."""
+    restore = {field: po[field] for field in po_update["$set"] if field in po}
+    missing = {field: "" for field in po_update["$set"] if field not in po}
+    update = {
+        "$set": {**restore, "updated_at": now},
+        "$inc": {field: -value for field, value in po_update["$inc"].items()},
+        "$pull": {"receipts": {"received_at": receipt["received_at"]}}
+    }
+    if missing:
+        update["$unset"] = missing
+    await db.purchase_orders.update_one(
+        {"_id": po["_id"], "receipt_count": po.get("receipt_count", 0) + 1},
+        update
+    )
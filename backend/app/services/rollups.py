@@ -0,0 +1,185 @@
+"""
+Daily sales rollups.
+
+One document per (date, medicine_id) in the `daily_rollups` collection holding
+the units sold, line revenue (before GST), GST, number of bills and number of
+direct sales for that medicine on that day; `date` is the "YYYY-MM-DD" day
+key. The documents are kept up to date with `$inc` upserts whenever a sale or
+bill is recorded or deleted, and can be rebuilt from the raw `sales` and
+`bills` collections with:
+
+    python -m app.services.rollups
+"""
+
+import asyncio
+from pymongo import UpdateOne
+from app.dates import day_expr
+from app.indexes import INDEXES
+from app.services.time_buckets import to_date
+
+ROLLUP_FIELDS = ["quantity", "revenue", "gst", "bill_count", "sale_count"]
+REBUILD_COLLECTION = "daily_rollups_rebuild"
+
+
+def _rollup_update(date: str, medicine_id: str, medicine_name: str, increments: dict) -> UpdateOne:
+    return UpdateOne(
+        {"date": date, "medicine_id": medicine_id},
+        {"$inc": increments, "$set": {"medicine_name": medicine_name}},
+        upsert=True
+    )
+
+
+async def record_sale(db, sale: dict):
+    """Add a direct sale to its day's rollup."""
+    update = _rollup_update(to_date(sale["sale_date"]).isoformat(), sale["medicine_id"], sale["medicine_name"], {
+        "quantity": sale["quantity"],
+        "revenue": sale["total"],
+        "gst": 0,
+        "bill_count": 0,
+        "sale_count": 1
+    })
+    await db.daily_rollups.bulk_write([update])
+
+
+async def record_bill(db, bill: dict, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) every line of a bill from its day's rollups."""
+    date = to_date(bill["created_at"]).isoformat()
+    gst_rate = bill.get("gst_percentage", 0) / 100
+
+    # Combine repeated lines of the same medicine so each bill counts once per medicine
+    per_medicine = {}
+    for item in bill["items"]:
+        entry = per_medicine.setdefault(item["medicine_id"], {
+            "medicine_name": item["medicine_name"],
+            "quantity": 0,
+            "revenue": 0
+        })
+        entry["quantity"] += item["quantity"]
+        entry["revenue"] += item["total"]
+
+    updates = [
+        _rollup_update(date, medicine_id, entry["medicine_name"], {
+            "quantity": sign * entry["quantity"],
+            "revenue": sign * entry["revenue"],
+            "gst": sign * entry["revenue"] * gst_rate,
+            "bill_count": sign,
+            "sale_count": 0
+        })
+        for medicine_id, entry in per_medicine.items()
+    ]
+    if updates:
+        await db.daily_rollups.bulk_write(updates, ordered=False)
+
+
+def _day_key(field: str) -> dict:
+    return {"$dateToString": {"date": day_expr(field), "format": "%Y-%m-%d"}}
+
+
+def _merge_stage() -> dict:
+    # Sum into an existing (date, medicine_id) rollup instead of replacing it
+    return {
+        "$merge": {
+            "into": REBUILD_COLLECTION,
+            "on": ["date", "medicine_id"],
+            "whenMatched": [{
+                "$set": {
+                    **{field: {"$add": [f"${field}", f"$$new.{field}"]} for field in ROLLUP_FIELDS},
+                    "medicine_name": "$$new.medicine_name"
+                }
+            }],
+            "whenNotMatched": "insert"
+        }
+    }
+
+
+async def rebuild_daily_rollups(db):
+    """
+    Recompute every rollup server-side from the raw sales and bills collections.
+
+    The rollups are built in a scratch collection that then replaces
+    `daily_rollups` in one rename, so readers never see a partial set. Sales
+    recorded while the rebuild runs are only counted if the pipelines read
+    them, so run it when traffic is quiet.
+    """
+    await db[REBUILD_COLLECTION].drop()
+    # $merge needs the unique (date, medicine_id) index; rename keeps it
+    await db[REBUILD_COLLECTION].create_indexes(INDEXES["daily_rollups"])
+
+    sales_pipeline = [
+        {"$group": {
+            "_id": {"date": _day_key("$sale_date"), "medicine_id": "$medicine_id"},
+            "medicine_name": {"$last": "$medicine_name"},
+            "quantity": {"$sum": "$quantity"},
+            "revenue": {"$sum": "$total"},
+            "sale_count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date",
+            "medicine_id": "$_id.medicine_id",
+            "medicine_name": 1,
+            "quantity": 1,
+            "revenue": 1,
+            "gst": {"$literal": 0},
+            "bill_count": {"$literal": 0},
+            "sale_count": 1
+        }},
+        _merge_stage()
+    ]
+    await db.sales.aggregate(sales_pipeline).to_list(length=None)
+
+    bills_pipeline = [
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "bill_id": "$_id",
+                "date": _day_key("$created_at"),
+                "medicine_id": "$items.medicine_id"
+            },
+            "medicine_name": {"$last": "$items.medicine_name"},
+            "quantity": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.total"},
+            "gst": {"$sum": {"$multiply": ["$items.total", {"$divide": ["$gst_percentage", 100]}]}}
+        }},
+        {"$group": {
+            "_id": {"date": "$_id.date", "medicine_id": "$_id.medicine_id"},
+            "medicine_name": {"$last": "$medicine_name"},
+            "quantity": {"$sum": "$quantity"},
+            "revenue": {"$sum": "$revenue"},
+            "gst": {"$sum": "$gst"},
+            "bill_count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date",
+            "medicine_id": "$_id.medicine_id",
+            "medicine_name": 1,
+            "quantity": 1,
+            "revenue": 1,
+            "gst": 1,
+            "bill_count": 1,
+            "sale_count": {"$literal": 0}
+        }},
+        _merge_stage()
+    ]
+    await db.bills.aggregate(bills_pipeline).to_list(length=None)
+
+    count = await db[REBUILD_COLLECTION].count_documents({})
+    await db[REBUILD_COLLECTION].rename("daily_rollups", dropTarget=True)
+    return count
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from app.database import MONGODB_URL, DATABASE_NAME
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        count = await rebuild_daily_rollups(client[DATABASE_NAME])
+        print(f"✅ Rebuilt {count} daily rollups")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,73 @@
+"""
+Document number sequences (purchase-order and bill numbers).
+
+Each sequence keeps one counter document per period in the `counters`
+collection, e.g. `{"_id": "bills:2024", "value": 1840}`, advanced atomically
+with `find_one_and_update` + `$inc`, so no two callers (workers or replicas)
+can receive the same number. The period comes from the current date (`day`,
+`year` or none), so numbering restarts with each new prefix.
+
+A sequence can reserve a block of numbers per round trip and hand them out
+from memory; numbers left in a block when the process stops are skipped, so
+block sizes above 1 trade gap-free numbering for fewer database calls. Unique
+indexes on the numbered fields back the allocator up.
+"""
+
+import asyncio
+from datetime import datetime
+from os import getenv
+from pymongo import ReturnDocument
+
+PERIOD_FORMATS = {"day": "%Y%m%d", "year": "%Y", None: ""}
+
+
+class Sequence:
+    def __init__(self, name: str, template: str, period: str = None, block_size: int = 1):
+        """
+        `template` is formatted with `period` (the period key) and `seq` (the
+        number), e.g. "PO-{period}-{seq:04d}".
+        """
+        if period not in PERIOD_FORMATS:
+            raise ValueError(f"Invalid period: {period}. Use one of day, year or None")
+        self.name = name
+        self.template = template
+        self.period = period
+        self.block_size = max(1, block_size)
+        self._blocks = {}  # period key -> [next, last]
+        self._lock = asyncio.Lock()
+
+    def _period_key(self) -> str:
+        return datetime.now().strftime(PERIOD_FORMATS[self.period])
+
+    async def _reserve(self, db, period_key: str) -> list:
+        counter = await db.counters.find_one_and_update(
+            {"_id": f"{self.name}:{period_key}" if period_key else self.name},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return [counter["value"] - self.block_size + 1, counter["value"]]
+
+    async def next_value(self, db) -> tuple:
+        """Return (period_key, number) for the next number in the current period."""
+        period_key = self._period_key()
+        async with self._lock:
+            block = self._blocks.get(period_key)
+            if block is None or block[0] > block[1]:
+                # Drop blocks from earlier periods; they are never used again
+                self._blocks = {period_key: await self._reserve(db, period_key)}
+                block = self._blocks[period_key]
+            value = block[0]
+            block[0] += 1
+        return period_key, value
+
+    async def next(self, db) -> str:
+        period_key, value = await self.next_value(db)
+        return self.template.format(period=period_key, seq=value)
+
+
+po_numbers = Sequence("purchase_orders", "PO-{period}-{seq:04d}", period="day")
+bill_numbers = Sequence(
+    "bills", "INV-{period}-{seq:06d}", period="year",
+    block_size=int(getenv("BILL_NUMBER_BLOCK", "20"))
+)
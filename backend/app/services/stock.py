@@ -0,0 +1,193 @@
+"""
+Stock movements for checkouts.
+
+`checkout` takes stock for every line of a bill or sale and inserts the
+document so that either everything is applied or nothing is. Each line is
+drawn from the medicine's lots, earliest expiry first (see app.services.lots),
+and the medicine totals are decremented in one bulk_write. On a replica set
+this all runs in one transaction with the insert, retried on write conflicts;
+there every line is drawn with one find and one bulk_write on `lots`.
+On a standalone server (no transactions) the lines are drawn concurrently, and
+anything drawn is put back with one compensating bulk_write if another line
+fails or the insert fails.
+"""
+
+import asyncio
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_concern import ReadConcern
+from app.services import lots
+
+
+class StockError(Exception):
+    """Base class for stock errors raised during checkout."""
+
+
+class MedicineNotFoundError(StockError):
+    def __init__(self, medicine_name: str):
+        self.medicine_name = medicine_name
+        super().__init__(f"Medicine {medicine_name} not found")
+
+
+class InsufficientStockError(StockError):
+    def __init__(self, medicine_name: str, available: int, requested: int):
+        self.medicine_name = medicine_name
+        self.available = available
+        self.requested = requested
+        super().__init__(
+            f"Insufficient stock for {medicine_name}! Available: {available}, Requested: {requested}"
+        )
+
+
+def supports_transactions(db) -> bool:
+    return db.client.topology_description.topology_type_name in ("ReplicaSetWithPrimary", "Sharded")
+
+
+def group_lines(items: list) -> dict:
+    """Combine line items per medicine: {medicine_id: {"medicine_name", "quantity"}}."""
+    lines = {}
+    for item in items:
+        line = lines.setdefault(item["medicine_id"], {"medicine_name": item["medicine_name"], "quantity": 0})
+        line["quantity"] += item["quantity"]
+    return lines
+
+
+async def _stock_error(db, med_id: str, line: dict, available: int) -> StockError:
+    if not await db.medicines.find_one({"_id": ObjectId(med_id)}, {"_id": 1}):
+        return MedicineNotFoundError(line["medicine_name"])
+    return InsufficientStockError(line["medicine_name"], available, line["quantity"])
+
+
+async def _take_line(db, med_id: str, line: dict) -> tuple:
+    try:
+        return await lots.take(db, med_id, line["quantity"])
+    except lots.LotShortfall as e:
+        raise await _stock_error(db, med_id, line, e.available)
+
+
+def _total_updates(lines: dict, sign: int) -> list:
+    return [
+        UpdateOne({"_id": ObjectId(med_id)}, {"$inc": {"quantity": sign * line["quantity"]}})
+        for med_id, line in lines.items()
+    ]
+
+
+async def bulk_write_or_undo(collection, updates: list, undo: list):
+    """Apply `updates`; if some fail, apply the `undo` of those that went through and re-raise."""
+    try:
+        await collection.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        applied = [update for index, update in enumerate(undo) if index not in failed]
+        if applied:
+            await collection.bulk_write(applied, ordered=False)
+        raise
+
+
+async def restore_stock(db, items: list, allocations: list = None):
+    """
+    Put the quantities of the given line items back into stock: into the lots
+    they were drawn from, or for bills and sales from before lot tracking (no
+    `allocations`), into each medicine's current lot.
+    """
+    lines = group_lines(items)
+    if not lines:
+        return
+    if allocations:
+        await lots.put_back(db, allocations)
+    else:
+        # The medicine's current stock must be in its lot before these units are added
+        await lots.backfill_medicines(db, lines)
+        ids = [ObjectId(med_id) for med_id in lines if ObjectId.is_valid(med_id)]
+        medicines = await db.medicines.find({"_id": {"$in": ids}}, {"batch_no": 1, "expiry_date": 1}).to_list(length=None)
+        updates = [
+            lots.lot_increment(str(med["_id"]), med.get("batch_no", ""), lots.lot_expiry(med.get("expiry_date")),
+                               lines[str(med["_id"])]["quantity"])
+            for med in medicines
+        ]
+        if updates:
+            await db.lots.bulk_write(updates, ordered=False)
+    await db.medicines.bulk_write(_total_updates(lines, 1), ordered=False)
+    await lots.refresh_heads(db, lines)
+
+
+async def run_in_transaction(db, callback):
+    """
+    Await `callback(session)` inside a transaction and return its result.
+
+    A transaction that hits a write conflict (TransientTransactionError) is
+    retried from the start and an UnknownTransactionCommitResult commit is
+    retried, so `callback` must be safe to run more than once. Reads see one
+    snapshot of the data.
+    """
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(callback, read_concern=ReadConcern("snapshot"))
+
+
+async def _checkout_transaction(db, lines: dict, collection: str, document: dict):
+    async def callback(session):
+        try:
+            taken = await lots.take_in_transaction(
+                db, {med_id: line["quantity"] for med_id, line in lines.items()}, session
+            )
+        except lots.LotShortfall as e:
+            raise await _stock_error(db, e.medicine_id, lines[e.medicine_id], e.available)
+        results = [taken[med_id] for med_id in lines]
+        document["lots"] = [allocation for allocations, _ in results for allocation in allocations]
+        await db.medicines.bulk_write(_total_updates(lines, -1), ordered=False, session=session)
+        result = await db[collection].insert_one(document, session=session)
+        return result, results
+
+    return await run_in_transaction(db, callback)
+
+
+async def _checkout_compensating(db, lines: dict, collection: str, document: dict):
+    results = await asyncio.gather(
+        *(_take_line(db, med_id, line) for med_id, line in lines.items()),
+        return_exceptions=True
+    )
+    taken = [allocation for result in results if not isinstance(result, BaseException) for allocation in result[0]]
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await lots.put_back(db, taken)
+        raise errors[0]
+
+    document["lots"] = taken
+    totals_applied = False
+    try:
+        await bulk_write_or_undo(db.medicines, _total_updates(lines, -1), _total_updates(lines, 1))
+        totals_applied = True
+        return await db[collection].insert_one(document), results
+    except Exception:
+        await lots.put_back(db, taken)
+        if totals_applied:
+            await db.medicines.bulk_write(_total_updates(lines, 1), ordered=False)
+        raise
+
+
+async def checkout(db, items: list, collection: str, document: dict):
+    """
+    Draw stock for all `items` (FEFO across lots) and insert `document` into
+    `collection`, all or nothing. The lots drawn from are recorded in
+    `document["lots"]`.
+
+    Raises MedicineNotFoundError or InsufficientStockError if any line cannot be filled.
+    """
+    lines = group_lines(items)
+    for med_id, line in lines.items():
+        if not ObjectId.is_valid(med_id):
+            raise MedicineNotFoundError(line["medicine_name"])
+
+    run = _checkout_transaction if supports_transactions(db) else _checkout_compensating
+    try:
+        result, results = await run(db, lines, collection, document)
+    except InsufficientStockError:
+        # A medicine from before lot tracking has no lots until it is backfilled
+        if not await lots.backfill_medicines(db, lines):
+            raise
+        result, results = await run(db, lines, collection, document)
+
+    # A medicine's earliest lot only changes when it runs out
+    await lots.refresh_heads(db, [med_id for med_id, (_, head_emptied) in zip(lines, results) if head_emptied])
+    return result
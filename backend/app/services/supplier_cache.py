@@ -0,0 +1,64 @@
+"""
+In-process cache of supplier summaries (name and contact details).
+
+Purchase-order routes resolve supplier names through `supplier_cache`, which
+fetches every supplier it doesn't hold with one `$in` query. Entries expire
+after SUPPLIER_CACHE_TTL seconds, at most SUPPLIER_CACHE_SIZE are kept (the
+least recently used go first), and the supplier create/update/delete routes
+invalidate them immediately on this worker (other workers catch up within the
+TTL).
+"""
+
+import time
+from collections import OrderedDict
+from os import getenv
+from bson import ObjectId
+
+SUPPLIER_CACHE_TTL = float(getenv("SUPPLIER_CACHE_TTL", "60"))
+SUPPLIER_CACHE_SIZE = int(getenv("SUPPLIER_CACHE_SIZE", "1000"))
+SUMMARY_FIELDS = {"name": 1, "contact_person": 1, "phone": 1, "email": 1}
+
+
+class SupplierCache:
+    def __init__(self, ttl: float = SUPPLIER_CACHE_TTL, max_size: int = SUPPLIER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # supplier_id -> (expires_at, summary), least recently used first
+
+    def invalidate(self, supplier_id: str = None):
+        if supplier_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(supplier_id, None)
+
+    async def get_many(self, db, supplier_ids) -> dict:
+        """Return {supplier_id: summary} for the suppliers that exist (one query for any misses)."""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        for supplier_id in set(supplier_ids):
+            entry = self._entries.get(supplier_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(supplier_id)
+                found[supplier_id] = entry[1]
+                continue
+            if entry:
+                del self._entries[supplier_id]
+            if ObjectId.is_valid(supplier_id):
+                missing.append(ObjectId(supplier_id))
+
+        if missing:
+            async for supplier in db.suppliers.find({"_id": {"$in": missing}}, SUMMARY_FIELDS):
+                supplier_id = str(supplier.pop("_id"))
+                self._entries[supplier_id] = (now + self.ttl, supplier)
+                found[supplier_id] = supplier
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return found
+
+    async def get(self, db, supplier_id: str):
+        """Return the supplier's summary, or None if it doesn't exist."""
+        return (await self.get_many(db, [supplier_id])).get(supplier_id)
+
+
+supplier_cache = SupplierCache()
@@ -0,0 +1,87 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Union
+
+PERIODS = ("daily", "weekly", "monthly", "yearly")
+
+
+def to_date(value: Union[str, date, datetime]) -> date:
+    """Convert a date value (datetime, or a legacy "YYYY-MM-DD" / "YYYY-MM-DD HH:MM:SS" string) to a date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+class TimeBuckets:
+    """
+    Consecutive daily, weekly, monthly or yearly buckets covering [start, end].
+
+    Every bucket is created up front (empty buckets included) and each row is
+    assigned to its bucket by date arithmetic, so filling a series costs
+    O(rows + buckets). Weekly buckets are 7-day windows starting at `start`.
+    """
+
+    def __init__(self, start: Union[date, datetime], end: Union[date, datetime], period: str, fields: Iterable[str]):
+        if period not in PERIODS:
+            raise ValueError(f"Invalid period: {period}. Use one of {', '.join(PERIODS)}")
+
+        self.start = to_date(start)
+        self.end = to_date(end)
+        self.period = period
+        self.fields = list(fields)
+        self.buckets = [
+            {"date": bucket_start.strftime("%Y-%m-%d"), "label": label, **{field: 0 for field in self.fields}}
+            for bucket_start, label in self._bucket_starts()
+        ]
+
+    def _bucket_starts(self):
+        if self.end < self.start:
+            return
+
+        if self.period == "daily":
+            for offset in range((self.end - self.start).days + 1):
+                day = self.start + timedelta(days=offset)
+                yield day, day.strftime("%b %d")
+
+        elif self.period == "weekly":
+            for week in range((self.end - self.start).days // 7 + 1):
+                yield self.start + timedelta(days=7 * week), f"Week {week + 1}"
+
+        elif self.period == "monthly":
+            first_month = self.start.year * 12 + self.start.month - 1
+            last_month = self.end.year * 12 + self.end.month - 1
+            for month in range(first_month, last_month + 1):
+                month_start = date(month // 12, month % 12 + 1, 1)
+                yield month_start, month_start.strftime("%b %Y")
+
+        else:
+            for year in range(self.start.year, self.end.year + 1):
+                yield date(year, 1, 1), str(year)
+
+    def index(self, value: Union[str, date, datetime]) -> Optional[int]:
+        """Return the bucket index for a date value, or None if it falls outside [start, end]."""
+        day = to_date(value)
+        if day < self.start or day > self.end:
+            return None
+
+        if self.period == "daily":
+            return (day - self.start).days
+        if self.period == "weekly":
+            return (day - self.start).days // 7
+        if self.period == "monthly":
+            return (day.year - self.start.year) * 12 + day.month - self.start.month
+        return day.year - self.start.year
+
+    def add(self, value: Union[str, date, datetime], **amounts) -> None:
+        """Add the given field amounts to the bucket containing `value`."""
+        idx = self.index(value)
+        if idx is None:
+            return
+
+        bucket = self.buckets[idx]
+        for field, amount in amounts.items():
+            bucket[field] += amount
+
+    def to_list(self) -> list:
+        return self.buckets
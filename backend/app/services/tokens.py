@@ -0,0 +1,133 @@
+"""
+Stateless signed auth tokens.
+
+A token is `<payload>.<signature>`: the payload is base64url JSON carrying the
+user's claims (email, role, ...), a random token id (`jti`) and its expiry
+(`exp`, unix seconds), and the signature is HMAC-SHA256 of the payload. Any
+worker holding the secret can verify a token without a database lookup.
+
+The secret comes from the AUTH_SECRET environment variable; if that is unset,
+one is generated on first start and shared through the `app_settings`
+collection, so every worker and replica signs with the same key.
+
+Logout revokes a token by adding its `jti` to the `revoked_tokens` collection,
+whose TTL index drops each entry once the token would have expired anyway.
+Every worker keeps an in-memory copy of the denylist and reloads it at most
+every TOKEN_DENYLIST_REFRESH seconds.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from datetime import datetime, timezone
+from os import getenv
+from pymongo import ReturnDocument
+
+TOKEN_TTL_SECONDS = int(getenv("TOKEN_TTL_SECONDS", str(7 * 24 * 3600)))
+DENYLIST_REFRESH = float(getenv("TOKEN_DENYLIST_REFRESH", "5"))
+
+_secret = {"key": getenv("AUTH_SECRET", "").encode() or None}
+
+
+class TokenError(Exception):
+    """The token is malformed, has a bad signature, has expired or was revoked."""
+
+
+async def load_token_secret(db):
+    """Use AUTH_SECRET, or the secret shared through the database (created on first use)."""
+    if _secret["key"]:
+        return
+    doc = await db.app_settings.find_one_and_update(
+        {"_id": "auth_secret"},
+        {"$setOnInsert": {"value": secrets.token_urlsafe(48)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _secret["key"] = doc["value"].encode()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    if not _secret["key"]:
+        raise RuntimeError("Token secret not loaded; call load_token_secret() at startup")
+    return _b64encode(hmac.new(_secret["key"], payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(claims: dict, ttl_seconds: int = TOKEN_TTL_SECONDS) -> str:
+    body = {**claims, "jti": secrets.token_urlsafe(16), "exp": int(time.time()) + ttl_seconds}
+    payload = _b64encode(json.dumps(body, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token: str) -> dict:
+    """Return the claims of a correctly signed, unexpired token (revocation is checked separately)."""
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        raise TokenError("Invalid token")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise TokenError("Invalid token")
+    if not isinstance(claims, dict) or "jti" not in claims:
+        raise TokenError("Invalid token")
+    if claims.get("exp", 0) < time.time():
+        raise TokenError("Token expired")
+    return claims
+
+
+class TokenDenylist:
+    """Local mirror of the shared `revoked_tokens` collection."""
+
+    def __init__(self, refresh_seconds: float = DENYLIST_REFRESH):
+        self.refresh_seconds = refresh_seconds
+        self._revoked = {}  # jti -> exp
+        self._synced_at = None
+        self._sync_lock = asyncio.Lock()
+
+    async def revoke(self, db, claims: dict):
+        self._revoked[claims["jti"]] = claims["exp"]
+        await db.revoked_tokens.update_one(
+            {"jti": claims["jti"]},
+            {"$setOnInsert": {
+                "exp": claims["exp"],
+                "expires_at": datetime.fromtimestamp(claims["exp"], timezone.utc)
+            }},
+            upsert=True
+        )
+
+    async def sync(self, db):
+        """Reload the denylist; it only holds unexpired tokens, so it stays small."""
+        now = time.time()
+        revoked = {
+            entry["jti"]: entry["exp"]
+            async for entry in db.revoked_tokens.find({"exp": {"$gte": now}}, {"jti": 1, "exp": 1})
+        }
+        # Keep local revocations whose write may not be visible yet
+        revoked.update({jti: exp for jti, exp in self._revoked.items() if exp >= now})
+        self._revoked = revoked
+        self._synced_at = time.monotonic()
+
+    def _due(self) -> bool:
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.refresh_seconds
+
+    async def is_revoked(self, db, jti: str) -> bool:
+        if self._due():
+            async with self._sync_lock:
+                # Requests that queued behind another refresh don't repeat it
+                if self._due():
+                    await self.sync(db)
+        return jti in self._revoked
+
+
+denylist = TokenDenylist()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Login-Storm Benchmark for Pharmacy Management System
+Runs a steady stream of synthetic billing probes on one event loop and reports
+their p50/p99 latency with no logins, for the whole of a login storm with
+password hashing offloaded to the hashing thread pool (as the API does), and for
+the same storm with hashing run inline on the event loop.
+
+The probes are synthetic, not the real checkout: each one sleeps 1 ms in place
+of its database round trips and then validates a Bill model. They measure how
+long the event loop keeps a request waiting, not what a checkout costs; run the
+API against MongoDB for end-to-end billing latency.
+
+Usage:
+    python benchmark_login.py [--logins 200] [--concurrency 50] [--probes 500]
+"""
+
+import argparse
+import asyncio
+import time
+import numpy as np
+from app.models import Bill
+from app.services.passwords import HASH_WORKERS, SCRYPT_N, hash_password_sync, verify_password, verify_password_sync
+
+SAMPLE_BILL = {
+    "bill_number": "INV0001",
+    "customer_name": "Walk-in",
+    "payment_mode": "Cash",
+    "items": [
+        {"medicine_id": f"m{i}", "medicine_name": f"Medicine {i}", "quantity": 2, "price": 10.0, "total": 20.0}
+        for i in range(5)
+    ],
+    "subtotal": 100.0,
+    "gst_amount": 18.0,
+    "grand_total": 118.0
+}
+
+
+async def billing_probes(count: int, interval: float, until: asyncio.Task = None) -> np.ndarray:
+    """Time `count` synthetic billing probes, or keep going until `until` finishes if given."""
+    latencies = []
+    while (until is None and len(latencies) < count) or (until is not None and not until.done()):
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)  # stand-in for the checkout's database round trips
+        Bill(**SAMPLE_BILL)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return np.array(latencies) * 1000
+
+
+async def login_storm(logins: int, concurrency: int, stored: str, inline: bool):
+    remaining = [logins]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            if inline:
+                verify_password_sync("correct horse", stored)
+                await asyncio.sleep(0)
+            else:
+                await verify_password("correct horse", stored)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run(mode: str, args, stored: str) -> tuple:
+    start = time.perf_counter()
+    if mode == "idle":
+        latencies = await billing_probes(args.probes, args.interval)
+    else:
+        storm = asyncio.create_task(login_storm(args.logins, args.concurrency, stored, inline=(mode == "inline")))
+        latencies = await billing_probes(args.probes, args.interval, until=storm)
+    return latencies, time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark billing latency during a login storm")
+    parser.add_argument("--logins", type=int, default=200, help="Password verifications in the storm")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent login requests")
+    parser.add_argument("--probes", type=int, default=500, help="Synthetic billing probes to time with no logins")
+    parser.add_argument("--interval", type=float, default=0.002, help="Seconds between billing probes")
+    args = parser.parse_args()
+
+    stored = hash_password_sync("correct horse")
+    start = time.perf_counter()
+    verify_password_sync("correct horse", stored)
+    print(f"🔐 scrypt n={SCRYPT_N}: {(time.perf_counter() - start) * 1000:.1f} ms per hash, {HASH_WORKERS} hashing threads")
+
+    for mode, title in (("idle", "No logins"), ("pool", "Login storm, hashing in pool"), ("inline", "Login storm, hashing inline")):
+        latencies, elapsed = await run(mode, args, stored)
+        print(f"⏱️  {title:<30} synthetic billing p50 {np.percentile(latencies, 50):7.2f} ms   "
+              f"p99 {np.percentile(latencies, 99):7.2f} ms   ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Demand Forecast Benchmark for Pharmacy Management System
+Times predict_demand on a synthetic sales history (default: 10,000 medicines x 1,000,000 sales)
+and optionally checks its output against a per-medicine scikit-learn fit on a sample.
+
+Usage:
+    python benchmark_predictions.py [--skus 10000] [--sales 1000000] [--verify]
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.services.ml_model import predict_demand
+
+
+def make_sales(skus: int, sales: int, days: int = 365, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    medicine = rng.integers(0, skus, sales)
+    day = rng.integers(0, days, sales)
+    trend = rng.normal(0, 0.02, skus)
+    quantity = np.maximum(1, np.round(5 + trend[medicine] * day + rng.normal(0, 2, sales))).astype(int)
+
+    return pd.DataFrame({
+        "medicine_name": pd.Categorical.from_codes(medicine, [f"Medicine {i}" for i in range(skus)]).astype(str),
+        "sale_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(day, unit="D"),
+        "quantity": quantity
+    })
+
+
+def sklearn_reference(df: pd.DataFrame, medicine: str) -> dict:
+    from sklearn.linear_model import LinearRegression
+
+    med_sales = df[df["medicine_name"] == medicine].sort_values("sale_date")
+    days = (med_sales["sale_date"] - med_sales["sale_date"].min()).dt.days
+    X = days.values.reshape(-1, 1)
+    y = med_sales["quantity"].values
+
+    model = LinearRegression().fit(X, y)
+    pred = model.predict(np.arange(days.max() + 1, days.max() + 8).reshape(-1, 1))
+    return {
+        "predicted_demand": round(max(0, pred.mean()), 2),
+        "confidence": round(min(0.95, model.score(X, y)), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch demand forecasting")
+    parser.add_argument("--skus", type=int, default=10_000)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--verify", action="store_true", help="Compare 50 medicines against scikit-learn")
+    args = parser.parse_args()
+
+    print(f"📦 Generating {args.sales:,} sales across {args.skus:,} medicines...")
+    df = make_sales(args.skus, args.sales)
+
+    start = time.perf_counter()
+    predictions = predict_demand(df)
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  Forecast {len(predictions):,} medicines in {elapsed:.2f}s")
+
+    if args.verify:
+        by_name = {p["medicine_name"]: p for p in predictions}
+        sample = list(by_name)[:50]
+        mismatches = 0
+        for medicine in sample:
+            expected = sklearn_reference(df, medicine)
+            actual = by_name[medicine]
+            if abs(expected["predicted_demand"] - actual["predicted_demand"]) > 0.011 \
+                    or abs(expected["confidence"] - actual["confidence"]) > 0.011:
+                mismatches += 1
+                print(f"❌ {medicine}: expected {expected}, got {actual}")
+        print(f"✅ Verified {len(sample) - mismatches}/{len(sample)} medicines against scikit-learn")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,14 @@ This script populates the database with valid sample data for testing and develo
 import asyncio
 import sys
 import os
-import hashlib
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 import random
+from app.indexes import ensure_indexes
+from app.services.passwords import hash_password_sync
+from app.services.rollups import rebuild_daily_rollups
+from app.services.forecasts import rebuild_forecast_stats
+from app.services.lots import backfill_lots
 
 # Database Configuration
 # Use environment variable if available (for Docker), otherwise use localhost (for local development)
@@ -19,9 +23,11 @@ DATABASE_NAME = os.getenv("DATABASE_NAME", "pharmacy_db")
 
 # Password hashing (same method as backend/app/routes/auth.py)
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    return hash_password_sync(password)
+
+# Sample Data (timestamps are stored as BSON dates; expiry dates at midnight)
+TODAY = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
-# Sample Data
 USERS = [
     {
         "email": "admin@pharmacy.com",
@@ -29,7 +35,7 @@ USERS = [
         "password": "admin123",  # Will be hashed
         "full_name": "Admin User",
         "role": "admin",
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": datetime.now()
     },
     {
         "email": "pharmacist@pharmacy.com",
@@ -37,7 +43,7 @@ USERS = [
         "password": "pharma123",
         "full_name": "John Pharmacist",
         "role": "pharmacist",
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": datetime.now()
     },
     {
         "email": "cashier@pharmacy.com",
@@ -45,63 +51,63 @@ USERS = [
         "password": "cashier123",
         "full_name": "Sarah Cashier",
         "role": "cashier",
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "created_at": datetime.now()
     }
 ]
 
 MEDICINES = [
     # Antibiotics
-    {"name": "Amoxicillin 500mg", "manufacturer": "PharmaCorp", "batch_no": "AMX2024001", "quantity": 150, "price": 12.50, "expiry_date": (datetime.now() + timedelta(days=365)).strftime("%Y-%m-%d"), "category": "Antibiotics", "reorder_level": 50},
-    {"name": "Azithromycin 250mg", "manufacturer": "MediLife", "batch_no": "AZI2024002", "quantity": 8, "price": 18.75, "expiry_date": (datetime.now() + timedelta(days=180)).strftime("%Y-%m-%d"), "category": "Antibiotics", "reorder_level": 30},
-    {"name": "Ciprofloxacin 500mg", "manufacturer": "HealthPlus", "batch_no": "CIP2024003", "quantity": 95, "price": 15.00, "expiry_date": (datetime.now() + timedelta(days=540)).strftime("%Y-%m-%d"), "category": "Antibiotics", "reorder_level": 40},
+    {"name": "Amoxicillin 500mg", "manufacturer": "PharmaCorp", "batch_no": "AMX2024001", "quantity": 150, "price": 12.50, "expiry_date": TODAY + timedelta(days=365), "category": "Antibiotics", "reorder_level": 50},
+    {"name": "Azithromycin 250mg", "manufacturer": "MediLife", "batch_no": "AZI2024002", "quantity": 8, "price": 18.75, "expiry_date": TODAY + timedelta(days=180), "category": "Antibiotics", "reorder_level": 30},
+    {"name": "Ciprofloxacin 500mg", "manufacturer": "HealthPlus", "batch_no": "CIP2024003", "quantity": 95, "price": 15.00, "expiry_date": TODAY + timedelta(days=540), "category": "Antibiotics", "reorder_level": 40},
     
     # Painkillers
-    {"name": "Paracetamol 500mg", "manufacturer": "GenericMed", "batch_no": "PAR2024004", "quantity": 250, "price": 5.00, "expiry_date": (datetime.now() + timedelta(days=730)).strftime("%Y-%m-%d"), "category": "Painkillers", "reorder_level": 100},
-    {"name": "Ibuprofen 400mg", "manufacturer": "PainRelief Inc", "batch_no": "IBU2024005", "quantity": 120, "price": 8.50, "expiry_date": (datetime.now() + timedelta(days=450)).strftime("%Y-%m-%d"), "category": "Painkillers", "reorder_level": 60},
-    {"name": "Aspirin 75mg", "manufacturer": "CardioHealth", "batch_no": "ASP2024006", "quantity": 180, "price": 6.25, "expiry_date": (datetime.now() + timedelta(days=600)).strftime("%Y-%m-%d"), "category": "Painkillers", "reorder_level": 80},
+    {"name": "Paracetamol 500mg", "manufacturer": "GenericMed", "batch_no": "PAR2024004", "quantity": 250, "price": 5.00, "expiry_date": TODAY + timedelta(days=730), "category": "Painkillers", "reorder_level": 100},
+    {"name": "Ibuprofen 400mg", "manufacturer": "PainRelief Inc", "batch_no": "IBU2024005", "quantity": 120, "price": 8.50, "expiry_date": TODAY + timedelta(days=450), "category": "Painkillers", "reorder_level": 60},
+    {"name": "Aspirin 75mg", "manufacturer": "CardioHealth", "batch_no": "ASP2024006", "quantity": 180, "price": 6.25, "expiry_date": TODAY + timedelta(days=600), "category": "Painkillers", "reorder_level": 80},
     
     # Antihistamines
-    {"name": "Cetirizine 10mg", "manufacturer": "AllergyFree", "batch_no": "CET2024007", "quantity": 5, "price": 7.50, "expiry_date": (datetime.now() + timedelta(days=20)).strftime("%Y-%m-%d"), "category": "Antihistamines", "reorder_level": 50},
-    {"name": "Loratadine 10mg", "manufacturer": "NoSneezeRx", "batch_no": "LOR2024008", "quantity": 85, "price": 9.00, "expiry_date": (datetime.now() + timedelta(days=400)).strftime("%Y-%m-%d"), "category": "Antihistamines", "reorder_level": 45},
+    {"name": "Cetirizine 10mg", "manufacturer": "AllergyFree", "batch_no": "CET2024007", "quantity": 5, "price": 7.50, "expiry_date": TODAY + timedelta(days=20), "category": "Antihistamines", "reorder_level": 50},
+    {"name": "Loratadine 10mg", "manufacturer": "NoSneezeRx", "batch_no": "LOR2024008", "quantity": 85, "price": 9.00, "expiry_date": TODAY + timedelta(days=400), "category": "Antihistamines", "reorder_level": 45},
     
     # Vitamins
-    {"name": "Vitamin D3 1000IU", "manufacturer": "VitaLife", "batch_no": "VD32024009", "quantity": 200, "price": 14.99, "expiry_date": (datetime.now() + timedelta(days=800)).strftime("%Y-%m-%d"), "category": "Vitamins", "reorder_level": 70},
-    {"name": "Vitamin C 500mg", "manufacturer": "ImmuneBoost", "batch_no": "VTC2024010", "quantity": 150, "price": 11.50, "expiry_date": (datetime.now() + timedelta(days=700)).strftime("%Y-%m-%d"), "category": "Vitamins", "reorder_level": 60},
-    {"name": "Multivitamin Complex", "manufacturer": "DailyHealth", "batch_no": "MUL2024011", "quantity": 3, "price": 22.00, "expiry_date": (datetime.now() + timedelta(days=15)).strftime("%Y-%m-%d"), "category": "Vitamins", "reorder_level": 50},
+    {"name": "Vitamin D3 1000IU", "manufacturer": "VitaLife", "batch_no": "VD32024009", "quantity": 200, "price": 14.99, "expiry_date": TODAY + timedelta(days=800), "category": "Vitamins", "reorder_level": 70},
+    {"name": "Vitamin C 500mg", "manufacturer": "ImmuneBoost", "batch_no": "VTC2024010", "quantity": 150, "price": 11.50, "expiry_date": TODAY + timedelta(days=700), "category": "Vitamins", "reorder_level": 60},
+    {"name": "Multivitamin Complex", "manufacturer": "DailyHealth", "batch_no": "MUL2024011", "quantity": 3, "price": 22.00, "expiry_date": TODAY + timedelta(days=15), "category": "Vitamins", "reorder_level": 50},
     
     # Antacids
-    {"name": "Omeprazole 20mg", "manufacturer": "GastroRelief", "batch_no": "OME2024012", "quantity": 110, "price": 13.25, "expiry_date": (datetime.now() + timedelta(days=500)).strftime("%Y-%m-%d"), "category": "Antacids", "reorder_level": 50},
-    {"name": "Ranitidine 150mg", "manufacturer": "DigestEase", "batch_no": "RAN2024013", "quantity": 75, "price": 10.50, "expiry_date": (datetime.now() + timedelta(days=350)).strftime("%Y-%m-%d"), "category": "Antacids", "reorder_level": 40},
+    {"name": "Omeprazole 20mg", "manufacturer": "GastroRelief", "batch_no": "OME2024012", "quantity": 110, "price": 13.25, "expiry_date": TODAY + timedelta(days=500), "category": "Antacids", "reorder_level": 50},
+    {"name": "Ranitidine 150mg", "manufacturer": "DigestEase", "batch_no": "RAN2024013", "quantity": 75, "price": 10.50, "expiry_date": TODAY + timedelta(days=350), "category": "Antacids", "reorder_level": 40},
     
     # Cough & Cold
-    {"name": "Dextromethorphan Syrup", "manufacturer": "CoughAway", "batch_no": "DEX2024014", "quantity": 60, "price": 16.75, "expiry_date": (datetime.now() + timedelta(days=300)).strftime("%Y-%m-%d"), "category": "Cough & Cold", "reorder_level": 35},
-    {"name": "Guaifenesin 400mg", "manufacturer": "RespiClear", "batch_no": "GUA2024015", "quantity": 90, "price": 12.00, "expiry_date": (datetime.now() + timedelta(days=420)).strftime("%Y-%m-%d"), "category": "Cough & Cold", "reorder_level": 45},
+    {"name": "Dextromethorphan Syrup", "manufacturer": "CoughAway", "batch_no": "DEX2024014", "quantity": 60, "price": 16.75, "expiry_date": TODAY + timedelta(days=300), "category": "Cough & Cold", "reorder_level": 35},
+    {"name": "Guaifenesin 400mg", "manufacturer": "RespiClear", "batch_no": "GUA2024015", "quantity": 90, "price": 12.00, "expiry_date": TODAY + timedelta(days=420), "category": "Cough & Cold", "reorder_level": 45},
     
     # Diabetes
-    {"name": "Metformin 500mg", "manufacturer": "DiabetesCare", "batch_no": "MET2024016", "quantity": 6, "price": 19.50, "expiry_date": (datetime.now() + timedelta(days=25)).strftime("%Y-%m-%d"), "category": "Diabetes", "reorder_level": 60},
-    {"name": "Glimepiride 2mg", "manufacturer": "SugarControl", "batch_no": "GLI2024017", "quantity": 85, "price": 24.00, "expiry_date": (datetime.now() + timedelta(days=480)).strftime("%Y-%m-%d"), "category": "Diabetes", "reorder_level": 40},
+    {"name": "Metformin 500mg", "manufacturer": "DiabetesCare", "batch_no": "MET2024016", "quantity": 6, "price": 19.50, "expiry_date": TODAY + timedelta(days=25), "category": "Diabetes", "reorder_level": 60},
+    {"name": "Glimepiride 2mg", "manufacturer": "SugarControl", "batch_no": "GLI2024017", "quantity": 85, "price": 24.00, "expiry_date": TODAY + timedelta(days=480), "category": "Diabetes", "reorder_level": 40},
     
     # Hypertension
-    {"name": "Amlodipine 5mg", "manufacturer": "HeartHealth", "batch_no": "AML2024018", "quantity": 130, "price": 17.25, "expiry_date": (datetime.now() + timedelta(days=550)).strftime("%Y-%m-%d"), "category": "Hypertension", "reorder_level": 55},
-    {"name": "Losartan 50mg", "manufacturer": "BP-Control", "batch_no": "LOS2024019", "quantity": 100, "price": 21.50, "expiry_date": (datetime.now() + timedelta(days=600)).strftime("%Y-%m-%d"), "category": "Hypertension", "reorder_level": 50},
+    {"name": "Amlodipine 5mg", "manufacturer": "HeartHealth", "batch_no": "AML2024018", "quantity": 130, "price": 17.25, "expiry_date": TODAY + timedelta(days=550), "category": "Hypertension", "reorder_level": 55},
+    {"name": "Losartan 50mg", "manufacturer": "BP-Control", "batch_no": "LOS2024019", "quantity": 100, "price": 21.50, "expiry_date": TODAY + timedelta(days=600), "category": "Hypertension", "reorder_level": 50},
     
     # Dermatology
-    {"name": "Clotrimazole Cream", "manufacturer": "SkinCare", "batch_no": "CLO2024020", "quantity": 45, "price": 14.00, "expiry_date": (datetime.now() + timedelta(days=280)).strftime("%Y-%m-%d"), "category": "Dermatology", "reorder_level": 30},
+    {"name": "Clotrimazole Cream", "manufacturer": "SkinCare", "batch_no": "CLO2024020", "quantity": 45, "price": 14.00, "expiry_date": TODAY + timedelta(days=280), "category": "Dermatology", "reorder_level": 30},
 ]
 
 CUSTOMERS = [
-    {"name": "Rajesh Kumar", "email": "rajesh.kumar@email.com", "phone": "+91-9876543210", "address": "123 MG Road, Bangalore, Karnataka 560001", "created_at": (datetime.now() - timedelta(days=120)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Priya Sharma", "email": "priya.sharma@email.com", "phone": "+91-9876543211", "address": "456 Park Street, Kolkata, West Bengal 700016", "created_at": (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Amit Patel", "email": "amit.patel@email.com", "phone": "+91-9876543212", "address": "789 Station Road, Ahmedabad, Gujarat 380001", "created_at": (datetime.now() - timedelta(days=75)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Sunita Reddy", "email": "sunita.reddy@email.com", "phone": "+91-9876543213", "address": "321 Banjara Hills, Hyderabad, Telangana 500034", "created_at": (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Vikram Singh", "email": "vikram.singh@email.com", "phone": "+91-9876543214", "address": "654 Connaught Place, New Delhi, Delhi 110001", "created_at": (datetime.now() - timedelta(days=45)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Anjali Desai", "email": "anjali.desai@email.com", "phone": "+91-9876543215", "address": "987 Marine Drive, Mumbai, Maharashtra 400002", "created_at": (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Karthik Iyer", "email": "karthik.iyer@email.com", "phone": "+91-9876543216", "address": "147 Anna Salai, Chennai, Tamil Nadu 600002", "created_at": (datetime.now() - timedelta(days=25)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Meera Nair", "email": "meera.nair@email.com", "phone": "+91-9876543217", "address": "258 MG Road, Kochi, Kerala 682016", "created_at": (datetime.now() - timedelta(days=20)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Rohan Mehta", "email": "rohan.mehta@email.com", "phone": "+91-9876543218", "address": "369 FC Road, Pune, Maharashtra 411004", "created_at": (datetime.now() - timedelta(days=15)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Divya Krishnan", "email": "divya.krishnan@email.com", "phone": "+91-9876543219", "address": "741 Residency Road, Bangalore, Karnataka 560025", "created_at": (datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Sanjay Gupta", "email": "sanjay.gupta@email.com", "phone": "+91-9876543220", "address": "852 Hazratganj, Lucknow, Uttar Pradesh 226001", "created_at": (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
-    {"name": "Pooja Verma", "email": "pooja.verma@email.com", "phone": "+91-9876543221", "address": "963 Civil Lines, Jaipur, Rajasthan 302006", "created_at": (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d %H:%M:%S"), "total_purchases": 0.0},
+    {"name": "Rajesh Kumar", "email": "rajesh.kumar@email.com", "phone": "+91-9876543210", "address": "123 MG Road, Bangalore, Karnataka 560001", "created_at": datetime.now() - timedelta(days=120), "total_purchases": 0.0},
+    {"name": "Priya Sharma", "email": "priya.sharma@email.com", "phone": "+91-9876543211", "address": "456 Park Street, Kolkata, West Bengal 700016", "created_at": datetime.now() - timedelta(days=90), "total_purchases": 0.0},
+    {"name": "Amit Patel", "email": "amit.patel@email.com", "phone": "+91-9876543212", "address": "789 Station Road, Ahmedabad, Gujarat 380001", "created_at": datetime.now() - timedelta(days=75), "total_purchases": 0.0},
+    {"name": "Sunita Reddy", "email": "sunita.reddy@email.com", "phone": "+91-9876543213", "address": "321 Banjara Hills, Hyderabad, Telangana 500034", "created_at": datetime.now() - timedelta(days=60), "total_purchases": 0.0},
+    {"name": "Vikram Singh", "email": "vikram.singh@email.com", "phone": "+91-9876543214", "address": "654 Connaught Place, New Delhi, Delhi 110001", "created_at": datetime.now() - timedelta(days=45), "total_purchases": 0.0},
+    {"name": "Anjali Desai", "email": "anjali.desai@email.com", "phone": "+91-9876543215", "address": "987 Marine Drive, Mumbai, Maharashtra 400002", "created_at": datetime.now() - timedelta(days=30), "total_purchases": 0.0},
+    {"name": "Karthik Iyer", "email": "karthik.iyer@email.com", "phone": "+91-9876543216", "address": "147 Anna Salai, Chennai, Tamil Nadu 600002", "created_at": datetime.now() - timedelta(days=25), "total_purchases": 0.0},
+    {"name": "Meera Nair", "email": "meera.nair@email.com", "phone": "+91-9876543217", "address": "258 MG Road, Kochi, Kerala 682016", "created_at": datetime.now() - timedelta(days=20), "total_purchases": 0.0},
+    {"name": "Rohan Mehta", "email": "rohan.mehta@email.com", "phone": "+91-9876543218", "address": "369 FC Road, Pune, Maharashtra 411004", "created_at": datetime.now() - timedelta(days=15), "total_purchases": 0.0},
+    {"name": "Divya Krishnan", "email": "divya.krishnan@email.com", "phone": "+91-9876543219", "address": "741 Residency Road, Bangalore, Karnataka 560025", "created_at": datetime.now() - timedelta(days=10), "total_purchases": 0.0},
+    {"name": "Sanjay Gupta", "email": "sanjay.gupta@email.com", "phone": "+91-9876543220", "address": "852 Hazratganj, Lucknow, Uttar Pradesh 226001", "created_at": datetime.now() - timedelta(days=5), "total_purchases": 0.0},
+    {"name": "Pooja Verma", "email": "pooja.verma@email.com", "phone": "+91-9876543221", "address": "963 Civil Lines, Jaipur, Rajasthan 302006", "created_at": datetime.now() - timedelta(days=3), "total_purchases": 0.0},
 ]
 
 
@@ -124,6 +130,7 @@ async def seed_database():
         print("\n🗑️  Clearing existing collections...")
         await db.users.delete_many({})
         await db.medicines.delete_many({})
+        await db.lots.delete_many({})
         await db.customers.delete_many({})
         await db.sales.delete_many({})
         await db.bills.delete_many({})
@@ -149,6 +156,8 @@ async def seed_database():
         result = await db.medicines.insert_many(MEDICINES)
         medicine_ids = result.inserted_ids
         print(f"✅ Inserted {len(medicine_ids)} medicines")
+        lot_count = (await backfill_lots(db))["backfilled"]
+        print(f"✅ Created {lot_count} stock lots")
         
         # Seed Customers
         print("\n🧑 Seeding customers...")
@@ -175,7 +184,7 @@ async def seed_database():
                 "medicine_name": medicine["name"],
                 "quantity": quantity,
                 "price": price,
-                "sale_date": (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d"),
+                "sale_date": datetime.now() - timedelta(days=days_ago),
                 "total": total,
                 "user_email": random.choice(USERS)["email"]
             }
@@ -231,13 +240,23 @@ async def seed_database():
                 "gst_percentage": gst_percentage,
                 "gst_amount": round(gst_amount, 2),
                 "grand_total": round(grand_total, 2),
-                "created_at": (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S")
+                "created_at": datetime.now() - timedelta(days=days_ago)
             }
             bills_data.append(bill)
         
         result = await db.bills.insert_many(bills_data)
         print(f"✅ Inserted {len(result.inserted_ids)} bills")
         
+        # Build daily rollups from the seeded sales and bills
+        print("\n📅 Building daily rollups...")
+        rollup_count = await rebuild_daily_rollups(db)
+        print(f"✅ Built {rollup_count} daily rollups")
+        
+        # Build forecast statistics from the seeded sales and bills
+        print("\n📐 Building forecast statistics...")
+        stats_count = await rebuild_forecast_stats(db)
+        print(f"✅ Built forecast statistics for {stats_count} medicines")
+        
         # Seed Predictions
         print("\n🔮 Seeding predictions...")
         predictions_data = []
@@ -261,13 +280,7 @@ async def seed_database():
         
         # Create indexes for better performance
         print("\n🔍 Creating indexes...")
-        await db.medicines.create_index("name")
-        await db.medicines.create_index("category")
-        await db.customers.create_index("email")
-        await db.customers.create_index("phone")
-        await db.users.create_index("email", unique=True)
-        await db.sales.create_index("sale_date")
-        await db.bills.create_index("bill_number")
+        await ensure_indexes(db)
         print("✅ Indexes created")
         
         # Summary
@@ -0,0 +1,72 @@
+"""
+The inventory report must make the same number of database round trips however
+many medicines are in the catalog.
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from mongomock_motor import AsyncMongoMockClient
+import app.database as database
+from app.routes import reports
+
+COLLECTION_CALLS = {"find", "find_one", "aggregate", "count_documents", "distinct"}
+
+
+class CountingCollection:
+    def __init__(self, collection, calls: Counter):
+        self._collection = collection
+        self._calls = calls
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in COLLECTION_CALLS:
+            def counted(*args, **kwargs):
+                self._calls[f"{self._collection.name}.{name}"] += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class CountingDatabase:
+    def __init__(self, db):
+        self._db = db
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        return CountingCollection(self._db[name], self.calls)
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self.calls)
+
+
+async def _inventory_report_calls(monkeypatch, medicine_count: int) -> Counter:
+    db = AsyncMongoMockClient()["pharmacy_test"]
+    today = datetime.now()
+    result = await db.medicines.insert_many([
+        {
+            "name": f"Medicine {i}", "batch_no": f"B{i}", "quantity": 10 + i, "price": 5.0,
+            "expiry_date": today + timedelta(days=10 * i), "category": "General", "reorder_level": 20
+        }
+        for i in range(medicine_count)
+    ])
+    await db.sales.insert_many([
+        {
+            "medicine_id": str(med_id), "medicine_name": f"Medicine {i}", "quantity": 2,
+            "price": 5.0, "total": 10.0, "sale_date": today - timedelta(days=i % 20)
+        }
+        for i, med_id in enumerate(result.inserted_ids)
+    ])
+
+    counting = CountingDatabase(db)
+    monkeypatch.setattr(database, "db", counting)
+    report = await reports.get_inventory_report(None)
+    assert report["summary"]["total_medicines"] == medicine_count
+    return counting.calls
+
+
+def test_inventory_report_round_trips_do_not_grow_with_catalog(monkeypatch):
+    one = asyncio.run(_inventory_report_calls(monkeypatch, 1))
+    fifty = asyncio.run(_inventory_report_calls(monkeypatch, 50))
+    assert sum(one.values()) > 0
+    assert fifty == one
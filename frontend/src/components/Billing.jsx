@@ -717,6 +717,7 @@ function AddBillModal({ isDark, medicines, customers, onClose, onSuccess }) {
 // Edit Bill Modal Component
 function EditBillModal({ isDark, bill, medicines, customers, onClose, onSuccess }) {
   const [formData, setFormData] = useState({
+    bill_number: bill.bill_number,
     customer_name: bill.customer_name || '',
     customer_phone: bill.customer_phone || '',
     customer_gstin: bill.customer_gstin || '',
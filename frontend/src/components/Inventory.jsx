@@ -46,7 +46,7 @@ export default function Inventory() {
   };
 
   const handleEdit = (medicine) => {
-    setFormData(medicine);
+    setFormData({ ...medicine, expiry_date: medicine.expiry_date ? medicine.expiry_date.split('T')[0] : '' });
     setEditingId(medicine._id);
     setShowForm(true);
   };
@@ -212,7 +212,7 @@ export default function Inventory() {
                   <td className="border p-3">{med.batch_no}</td>
                   <td className="border p-3">{med.quantity}</td>
                   <td className="border p-3">₹{med.price}</td>
-                  <td className="border p-3">{med.expiry_date}</td>
+                  <td className="border p-3">{new Date(med.expiry_date).toLocaleDateString()}</td>
                   <td className="border p-3">{med.category}</td>
 
                   <td className="border p-3 text-center">
@@ -25,16 +25,6 @@ const NotificationCenter = () => {
     }
   };
 
-  // Fetch unread count
-  const fetchUnreadCount = async () => {
-    try {
-      const data = await api.getUnreadNotificationCount();
-      setUnreadCount(data.unread_count);
-    } catch (error) {
-      console.error('Error fetching unread count:', error);
-    }
-  };
-
   // Generate new notifications
   const generateNotifications = async () => {
     setLoading(true);
@@ -93,12 +83,15 @@ const NotificationCenter = () => {
     fetchNotifications();
     generateNotifications(); // Auto-generate on mount
     
-    // Auto-refresh every 60 seconds
-    const interval = setInterval(() => {
-      fetchUnreadCount();
-    }, 60000);
+    // Live updates pushed by the server
+    const source = api.subscribeNotifications({
+      onNotification: (notification) => {
+        setNotifications(prev => [notification, ...prev.filter(n => n._id !== notification._id)].slice(0, 20));
+      },
+      onUnreadCount: setUnreadCount
+    });
 
-    return () => clearInterval(interval);
+    return () => source.close();
   }, []);
 
   // Close dropdown when clicking outside
@@ -177,21 +177,24 @@ const PurchaseOrders = () => {
   const handleReceivePO = async (e) => {
     e.preventDefault();
 
-    const invalidItems = receiveData.items.filter(item => 
-      !item.quantity_received || item.quantity_received <= 0 || !item.batch_number
+    // Lines left at 0 stay outstanding on the PO (partial delivery)
+    const receivedItems = receiveData.items.filter(item => parseInt(item.quantity_received) > 0);
+    const invalidItems = receivedItems.filter(item =>
+      parseInt(item.quantity_received) > item.quantity_remaining || !item.batch_no || !item.expiry_date
     );
 
-    if (invalidItems.length > 0) {
-      setError('Please fill quantity received and batch number for all items');
+    if (receivedItems.length === 0 || invalidItems.length > 0) {
+      setError('Please fill quantity received (up to the outstanding quantity), batch number and expiry date for the delivered items');
       return;
     }
 
     try {
       const data = {
-        items: receiveData.items.map(item => ({
+        items: receivedItems.map(item => ({
           medicine_id: item.medicine_id,
           quantity_received: parseInt(item.quantity_received),
-          batch_number: item.batch_number
+          batch_no: item.batch_no,
+          expiry_date: item.expiry_date
         })),
         payment_status: receiveData.payment_status
       };
@@ -236,8 +239,10 @@ const PurchaseOrders = () => {
         medicine_id: item.medicine_id,
         medicine_name: item.medicine_name,
         quantity_ordered: item.quantity,
+        quantity_remaining: item.quantity_remaining ?? item.quantity,
         quantity_received: '',
-        batch_number: ''
+        batch_no: '',
+        expiry_date: ''
       })),
       payment_status: 'Pending'
     });
@@ -685,9 +690,9 @@ const PurchaseOrders = () => {
                       >
                         <p className="font-medium mb-2">{item.medicine_name}</p>
                         <p className="text-sm text-gray-500 dark:text-gray-400 mb-3">
-                          Ordered Quantity: {item.quantity_ordered}
+                          Ordered Quantity: {item.quantity_ordered} · Outstanding: {item.quantity_remaining}
                         </p>
-                        <div className="grid grid-cols-1 md:grid-cols-2 gap-3">
+                        <div className="grid grid-cols-1 md:grid-cols-3 gap-3">
                           <div>
                             <label className="block text-sm font-medium mb-1">Quantity Received *</label>
                             <input
@@ -703,8 +708,8 @@ const PurchaseOrders = () => {
                                   ? 'bg-gray-600 border-gray-500 text-white' 
                                   : 'bg-white border-gray-300 text-gray-900'
                               } focus:outline-none focus:ring-2 focus:ring-blue-500`}
-                              min="1"
-                              max={item.quantity_ordered}
+                              min="0"
+                              max={item.quantity_remaining}
                               required
                             />
                           </div>
@@ -712,10 +717,10 @@ const PurchaseOrders = () => {
                             <label className="block text-sm font-medium mb-1">Batch Number *</label>
                             <input
                               type="text"
-                              value={item.batch_number}
+                              value={item.batch_no}
                               onChange={(e) => {
                                 const newItems = [...receiveData.items];
-                                newItems[index].batch_number = e.target.value;
+                                newItems[index].batch_no = e.target.value;
                                 setReceiveData({ ...receiveData, items: newItems });
                               }}
                               className={`w-full px-3 py-2 rounded-lg border ${
@@ -723,7 +728,25 @@ const PurchaseOrders = () => {
                                   ? 'bg-gray-600 border-gray-500 text-white' 
                                   : 'bg-white border-gray-300 text-gray-900'
                               } focus:outline-none focus:ring-2 focus:ring-blue-500`}
-                              required
+                              required={parseInt(item.quantity_received) > 0}
+                            />
+                          </div>
+                          <div>
+                            <label className="block text-sm font-medium mb-1">Expiry Date *</label>
+                            <input
+                              type="date"
+                              value={item.expiry_date}
+                              onChange={(e) => {
+                                const newItems = [...receiveData.items];
+                                newItems[index].expiry_date = e.target.value;
+                                setReceiveData({ ...receiveData, items: newItems });
+                              }}
+                              className={`w-full px-3 py-2 rounded-lg border ${
+                                isDark 
+                                  ? 'bg-gray-600 border-gray-500 text-white' 
+                                  : 'bg-white border-gray-300 text-gray-900'
+                              } focus:outline-none focus:ring-2 focus:ring-blue-500`}
+                              required={parseInt(item.quantity_received) > 0}
                             />
                           </div>
                         </div>
@@ -224,7 +224,7 @@ export default function Sales() {
                 <td className="p-2 border">{sale.quantity}</td>
                 <td className="p-2 border">₹{sale.price}</td>
                 <td className="p-2 border">₹{sale.total.toFixed(2)}</td>
-                <td className="p-2 border">{sale.sale_date}</td>
+                <td className="p-2 border">{new Date(sale.sale_date).toLocaleDateString()}</td>
               </tr>
             ))}
           </tbody>
@@ -600,7 +600,7 @@ export default function Suppliers() {
                         <div>
                           <div className="font-medium">{po.po_number}</div>
                           <div className="text-sm text-gray-600 dark:text-gray-400">
-                            {po.order_date} · {po.items?.length || 0} items
+                            {new Date(po.order_date).toLocaleDateString()} · {po.items?.length || 0} items
                           </div>
                         </div>
                         <div className="text-right">
@@ -122,6 +122,32 @@ export const api = {
     }
   },
 
+  getMedicinePrediction: async (medicineId, horizonDays = 7) => {
+    try {
+      const res = await fetch(`${API_BASE}/api/predictions/${medicineId}?horizon_days=${horizonDays}`);
+      if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+      return await res.json();
+    } catch (error) {
+      console.error('Error fetching medicine prediction:', error);
+      return null;
+    }
+  },
+
+  queryPredictions: async (medicineIds, horizonDays = 7) => {
+    try {
+      const res = await fetch(`${API_BASE}/api/predictions/query`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ medicine_ids: medicineIds, horizon_days: horizonDays })
+      });
+      if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+      return await res.json();
+    } catch (error) {
+      console.error('Error querying predictions:', error);
+      return { horizon_days: horizonDays, predictions: [], insufficient_data: medicineIds };
+    }
+  },
+
   // Customers
   getCustomers: async () => {
     try {
@@ -218,17 +244,11 @@ export const api = {
 
   createBill: async (billData) => {
     try {
-      // Generate bill number
-      const timestamp = Date.now();
-      const billNumber = `BILL-${timestamp}`;
-      
+      // The server allocates the bill number unless one is passed (e.g. when re-creating an edited bill)
       const res = await fetch(`${API_BASE}/api/billing/`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          ...billData,
-          bill_number: billNumber
-        })
+        body: JSON.stringify(billData)
       });
       
       if (!res.ok) {
@@ -352,6 +372,19 @@ export const api = {
     }
   },
 
+  // Opens a Server-Sent Events stream; returns the EventSource so callers can close it
+  subscribeNotifications: ({ onNotification, onUnreadCount } = {}) => {
+    const source = new EventSource(`${API_BASE}/api/notifications/stream`);
+    if (onNotification) {
+      source.addEventListener('notification', (e) => onNotification(JSON.parse(e.data)));
+    }
+    if (onUnreadCount) {
+      source.addEventListener('unread_count', (e) => onUnreadCount(JSON.parse(e.data).unread_count));
+    }
+    source.onerror = (error) => console.error('Notification stream error:', error);
+    return source;
+  },
+
   generateNotifications: async () => {
     try {
       const res = await fetch(`${API_BASE}/api/notifications/generate`, {